@@ -1,35 +1,24 @@
 import dash_bootstrap_components as dbc
 import flask_admin as admin
-import sqlalchemy.dialects
 from dash_extensions.enrich import DashProxy, MultiplexerTransform
 from flask import redirect
 from flask_admin import Admin, expose
 from flask_admin.contrib.sqla import ModelView
 from flask_login import LoginManager, current_user
 from flask_restful import Api
-from sqlalchemy import MetaData
 from sqlalchemy.orm import Session, declarative_base
 from sqlalchemy_utils import JSONType
 from werkzeug.security import check_password_hash, generate_password_hash
 
-from disease_trend_system.config import (SECRET_KEY, hostname_db, name_db,
-                                         password_db, port, username_db)
-from disease_trend_system.endpoints import SymptomsResource
-from disease_trend_system.models import Base, User, create_admin_user
+from disease_trend_system.config import SECRET_KEY
+from disease_trend_system.database import get_engine, statement_cache_stats
+from disease_trend_system.endpoints import (SymptomsBatchResource,
+                                            SymptomsResource)
+from disease_trend_system.models import User, create_admin_user
 
 
 def create_session():
-    usr = username_db
-    pswd = password_db
-    host = hostname_db
-    db = name_db
-    engine = sqlalchemy.create_engine(
-        f"mysql+pymysql://{usr}:{pswd}@{host}:{port}/{db}")
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    metadata.create_all(bind=engine, checkfirst=True)
-    Base.metadata.create_all(engine)
-    return Session(engine)
+    return Session(get_engine())
 
 
 app = DashProxy(__name__, assets_folder='assets',
@@ -50,7 +39,7 @@ class MyAdminIndexView(admin.AdminIndexView):
     def index(self):
         if not current_user.is_authenticated:
             return redirect('/desease-knowlege-base-dash/login')
-        return super(MyAdminIndexView, self).index()
+        return self.render(self._template, sql_cache=statement_cache_stats())
 
 
 class DiseaseModelView(ModelView):
@@ -72,6 +61,7 @@ api = Api(srv)
 
 
 api.add_resource(SymptomsResource, '/symptoms')
+api.add_resource(SymptomsBatchResource, '/symptoms/batch')
 
 app.config.suppress_callback_exceptions = True
 
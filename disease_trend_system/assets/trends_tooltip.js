@@ -0,0 +1,37 @@
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    trends: {
+        /**
+         * Подсказка графика трендов по customdata точки:
+         * [имя симптомокомлекса, число симптомов, описание]
+         * (колонки TOOLTIP_COLUMNS в trends_callbacks.py).
+         */
+        graphTooltip: function (hoverData) {
+            const noUpdate = window.dash_clientside.no_update;
+            if (!hoverData || !hoverData.points.length || !hoverData.points[0].customdata) {
+                return [false, noUpdate, noUpdate];
+            }
+            const pt = hoverData.points[0];
+            const [name, form, desc] = pt.customdata;
+            const children = [{
+                namespace: "dash_html_components",
+                type: "Div",
+                props: {
+                    style: {"width": "20vw", "white-space": "normal"},
+                    children: [
+                        {
+                            namespace: "dash_html_components",
+                            type: "H3",
+                            props: {
+                                children: name,
+                                style: {"color": "darkblue", "overflow-wrap": "break-word"}
+                            }
+                        },
+                        {namespace: "dash_html_components", type: "P", props: {children: form}},
+                        {namespace: "dash_html_components", type: "P", props: {children: desc}}
+                    ]
+                }
+            }];
+            return [true, pt.bbox, children];
+        }
+    }
+});
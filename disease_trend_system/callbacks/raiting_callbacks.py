@@ -1,21 +1,17 @@
 import json
 from datetime import datetime, timedelta
-from typing import Any, Dict
+from typing import Dict, List
 
-import plotly.express as px
-from dash import no_update
-from dash.exceptions import PreventUpdate
-from dash_extensions.enrich import Input, Output, State, html
+from dash_extensions.enrich import Input, Output
 
 from disease_trend_system.app import app
-from disease_trend_system.config import (hostname_db, name_db, password_db,
-                                         port, username_db)
-from disease_trend_system.services.create_data_trend import TrendDetector
+from disease_trend_system.config import rating_window
+from disease_trend_system.layouts.raiting_layout import COLUMNS, SCORE_COLUMNS
+from disease_trend_system.services.rating_engine import RATING_METRICS
 from disease_trend_system.services.fake_name_service import \
     generate_fake_symptom_complex_name
-from disease_trend_system.services.symptom_complexes_dao import SymptomsDAO
-
-MAX_DELTA = 30
+from disease_trend_system.services.symptom_complexes_dao import \
+    get_symptoms_dao
 
 
 def pprint_json(json_str: str) -> str:
@@ -40,45 +36,60 @@ def pprint_json(json_str: str) -> str:
 
 @app.callback(
     Output("table-2", "data"),
+    Output("table-2", "page_count"),
+    Output("table-2", "columns"),
     Output("header-report", "children"),
-    Input("date-range-3", "date")
+    Input("date-range-3", "date"),
+    Input("dropdown-metric-3", "value"),
+    Input("table-2", "page_current"),
+    Input("table-2", "page_size"),
+    Input("table-2", "sort_by"),
+    Input("table-2", "filter_query")
 )
-def update_raiting_table(date: datetime):
-    """Обновление графика трендов
+def update_raiting_table(date: datetime, metric: str, page_current: int,
+                         page_size: int, sort_by: List[Dict[str, str]],
+                         filter_query: str):
+    """Обновление таблицы рейтинга
 
-    Args:
-        n_clicks (int): Нажатие на кнопку
-        start_date (datetime): Начала периода
-        end_date (datetime): Конец периода
-        input_thresold (int): Порог тренда
+    По продолжительности рейтинг читается постранично из снимка
+    rating_snapshots (фильтр и сортировка таблицы - в запросе к снимку),
+    по метрикам силы тренда - отбирается из закешированных оценок.
+    Короткие имена и описания формируются только для строк страницы.
 
-    Raises:
-        PreventUpdate: Не обновлять
+    Args:
+        date (datetime): Последний день периода
+        metric (str): Метрика ранжирования
+        page_current (int): Номер страницы
+        page_size (int): Размер страницы
+        sort_by (List[Dict[str, str]]): Сортировка таблицы
+        filter_query (str): Фильтр таблицы
 
     Returns:
-        Figure: Объект Figure
+        Tuple[List[Dict], int, List[Dict], str]: Строки страницы, число
+            страниц, колонки таблицы и заголовок
     """
-
-    symptom_dao = SymptomsDAO(
-        username_db, password_db, hostname_db, port, name_db)
     end_date = datetime.fromisoformat(date)
-    start_date = end_date - timedelta(days=MAX_DELTA)
-    df = symptom_dao.get_trends_data(start_date, end_date)
-    if not df.empty:
-        df["symptom_complex_hash"] = df["symptom_complex_hash"].apply(
-            generate_fake_symptom_complex_name)
-
+    start_date = end_date - timedelta(days=rating_window)
     d1 = start_date.strftime("%d/%m/%Y")
     d2 = end_date.strftime("%d/%m/%Y")
     header_report = f"Рейтинг симптомокомлексов с {d1} по {d2}"
-    df["extra"] = df["extra"].apply(pprint_json)
-    df["percent_people"] = df["percent_people"]/100
-    agg_df = df.groupby(["symptom_complex_hash", "extra"]).agg(
-        {"date": "count", "percent_people": "max", "total_number": "max"})
-    agg_df = agg_df.reset_index()
-    agg_df = agg_df.sort_values(['date'], ascending=False)
 
+    dao = get_symptoms_dao()
+    if metric in RATING_METRICS:
+        columns = COLUMNS[:-1] + SCORE_COLUMNS + COLUMNS[-1:]
+        df, page_count = dao.get_rating_top(end_date, metric, page_current, page_size,
+                                            filter_query, sort_by)
+        df = df.rename(columns={"active_days": "date", "max_percent": "percent_people",
+                                "max_total": "total_number"})
+    else:
+        columns = COLUMNS
+        df, page_count = dao.get_rating_page(end_date, page_current, page_size,
+                                             filter_query, sort_by)
     if df.empty:
-        return [], header_report
+        return [], page_count, columns, header_report
 
-    return agg_df.to_dict('records'), header_report
+    df["symptom_complex_hash"] = df["symptom_complex_hash"].apply(
+        generate_fake_symptom_complex_name)
+    df["extra"] = df["extra"].apply(pprint_json)
+    df["percent_people"] = df["percent_people"]/100
+    return df.to_dict('records'), page_count, columns, header_report
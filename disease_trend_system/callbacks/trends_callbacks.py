@@ -1,20 +1,54 @@
-import json
 from datetime import datetime
-from typing import Any, Dict
 
 import plotly.express as px
 import plotly.graph_objs as go
-from dash import no_update
+from dash import ClientsideFunction
 from dash.exceptions import PreventUpdate
-from dash_extensions.enrich import Input, Output, State, html
+from dash_extensions.enrich import Input, Output, State
+from pandas import DataFrame
 
 from disease_trend_system.app import app
-from disease_trend_system.config import (hostname_db, name_db, password_db,
-                                         port, username_db)
-from disease_trend_system.services.create_data_trend import TrendDetector
 from disease_trend_system.services.fake_name_service import \
     generate_fake_symptom_complex_name
-from disease_trend_system.services.symptom_complexes_dao import SymptomsDAO
+from disease_trend_system.services.symptom_complexes_dao import \
+    get_symptoms_dao
+from disease_trend_system.services.trends_pipeline import get_trends_pipeline
+
+
+TOOLTIP_COLUMNS = ["tooltip_name", "tooltip_form", "tooltip_desc"]
+
+
+def _tooltip_desc(extra: str) -> str:
+    """Укороченное описание для подсказки
+
+    extra - JSON, собранный GROUP_CONCAT и, возможно, обрезанный по
+    group_concat_max_len, поэтому показывается как есть, без разбора.
+
+    Args:
+        extra (str): Признаки симптомокомлекса из get_trends_data
+
+    Returns:
+        str: Описание
+    """
+    if len(extra) > 300:
+        return extra[:100] + '...'
+    return extra
+
+
+def add_tooltip_columns(df: DataFrame) -> None:
+    """Добавить колонки подсказки, которые передаются в customdata графика
+
+    Подсказку рисует клиентский callback trends.graphTooltip
+    (assets/trends_tooltip.js) без запроса к серверу.
+
+    Args:
+        df (DataFrame): Результат конвейера трендов, изменяется на месте
+    """
+    descriptions = {extra: _tooltip_desc(extra) for extra in df["extra"].unique()}
+    df["tooltip_name"] = "Симптомокомлекс " + \
+        df["symptom_complex_hash"] + " " + df["date"]
+    df["tooltip_form"] = "Число симптомов " + df["symptom_count"].astype(str)
+    df["tooltip_desc"] = df["extra"].map(descriptions)
 
 
 @app.callback(
@@ -46,93 +80,49 @@ def update_line_chart(n_clicks: int, start_date: datetime,
     """
     if input_thresold is None:
         raise PreventUpdate
-    symptom_dao = SymptomsDAO(
-        username_db, password_db, hostname_db, port, name_db)
-
-    df = symptom_dao.get_trends_data(
-        start_date, end_date, city, region, hospital)
 
-    df = TrendDetector(input_thresold).execute(df)
-    if not df.empty:
-        df["symptom_complex_hash"] = df["symptom_complex_hash"].apply(
-            generate_fake_symptom_complex_name)
+    df = get_trends_pipeline().run(
+        start_date, end_date, city, region, hospital, input_thresold)
+    add_tooltip_columns(df)
     fig = px.line(df,
-                  x="date", y="percent_people", color="symptom_complex_hash", markers=True)
+                  x="date", y="percent_people", color="symptom_complex_hash", markers=True,
+                  custom_data=TOOLTIP_COLUMNS)
     fig.update_traces(mode="markers+lines", hovertemplate=None)
 
     return fig
 
 
 @app.callback(
-    Output("graph-tooltip", "show"),
-    Output("graph-tooltip", "bbox"),
-    Output("graph-tooltip", "children"),
-    Input("graph-1", "hoverData"),
-    State("date-range-1", "start_date"),
-    State("date-range-1", "end_date"),
-    State("id_threshold_input", "value"),
-    State("dropdown-city-1", "value"),
-    State("dropdown-region-1", "value"),
-    State("dropdown-hospital-1", "value")
+    Output("table-trending-1", "data"),
+    Input("btn-1", "n_clicks")
 )
-def display_hover(hoverData: Dict[str, Any],
-                  start_date: datetime,
-                  end_date: datetime,
-                  input_thresold: int,
-                  city: str, region: str,
-                  hospital: str):
-    """Подсказка при наведении
+def update_trending_table(_n_clicks: int):
+    """Симптомокомлексы, которые сейчас в тренде
+
+    Читается сохраненное состояние trend_states, которое обновляется при
+    записи наблюдений, поэтому история наблюдений не пересчитывается.
 
     Args:
-        hoverData (Dict[str,Any]): Данные при наведении на точку
-        start_date (datetime): Начало периода
-        end_date (datetime): Конец периода
-        input_thresold (int): Порог тренда
+        _n_clicks (int): Нажатие на кнопку (только запускает обновление)
 
     Returns:
-        Tuple[bool,Dict,List]: Кортеж для tooltip
+        List[Dict]: Строки таблицы
     """
-    if hoverData is None:
-        return False, no_update, no_update
-
-    pt = hoverData["points"][0]
-    bbox = pt["bbox"]
-    symptom_dao = SymptomsDAO(
-        username_db, password_db, hostname_db, port, name_db)
-    df = symptom_dao.get_trends_data(
-        start_date, end_date, city, region, hospital)
-
-    df = TrendDetector(input_thresold).execute(df)
-    if not df.empty:
-        df["symptom_complex_hash"] = df["symptom_complex_hash"].apply(
-            generate_fake_symptom_complex_name)
-    df = df[df["date"] == pt["x"]]
-    df = df[df["percent_people"] == pt["y"]]
-    df = df.iloc[0]
-
-    hover_data = df.to_dict()
-    hover_data["extra"] = hover_data["extra"].replace('\'', '\"')
-    hover_data["extra"] = hover_data["extra"].replace('\"{', '{')
-    hover_data["extra"] = hover_data["extra"].replace('}\"', '}')
-    num_symp = len(json.loads(hover_data["extra"]))
-    sympt_hash = hover_data["symptom_complex_hash"]
-    date = hover_data["date"]
-    name = f"Симптомокомлекс {sympt_hash} {date}"
-    form = f"Число симптомов {num_symp}"
-    desc = hover_data["extra"]
-    if len(desc) > 300:
-        desc = desc[:100] + '...'
-
-    children = [
-        html.Div([
-            html.H3(f"{name}", style={"color": "darkblue",
-                    "overflow-wrap": "break-word"}),
-            html.P(f"{form}"),
-            html.P(f"{desc}"),
-        ], style={'width': '20vw', 'white-space': 'normal'})
-    ]
-
-    return True, bbox, children
+    df = get_symptoms_dao().get_trending_complexes()
+    df["symptom_complex_hash"] = df["symptom_complex_hash"].map(
+        generate_fake_symptom_complex_name)
+    for column in ("segment_start", "last_day"):
+        df[column] = df[column].map(lambda day: day.isoformat() if day else "")
+    return df.sort_values("segment_start").to_dict('records')
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace="trends", function_name="graphTooltip"),
+    Output("graph-tooltip", "show"),
+    Output("graph-tooltip", "bbox"),
+    Output("graph-tooltip", "children"),
+    Input("graph-1", "hoverData")
+)
 
 
 @app.callback(
@@ -147,8 +137,7 @@ def update_dropdown_cities(city: str):
     """
     if city == '':
         return []
-    symptom_dao = SymptomsDAO(
-        username_db, password_db, hostname_db, port, name_db)
+    symptom_dao = get_symptoms_dao()
     return symptom_dao.get_regions_by_city(city)
 
 
@@ -166,6 +155,5 @@ def update_dropdown_hospitals(city: str, region: str):
     """
     if city == '' or region == '':
         return []
-    symptom_dao = SymptomsDAO(
-        username_db, password_db, hostname_db, port, name_db)
+    symptom_dao = get_symptoms_dao()
     return symptom_dao.get_hospitals_by_city_region(city, region)
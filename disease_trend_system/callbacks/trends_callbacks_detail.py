@@ -1,6 +1,6 @@
 import json
 from datetime import datetime
-from typing import Any, Dict
+from typing import Dict, List
 
 import plotly.express as px
 from dash import no_update
@@ -8,12 +8,10 @@ from dash.exceptions import PreventUpdate
 from dash_extensions.enrich import Input, Output, State, html
 
 from disease_trend_system.app import app
-from disease_trend_system.config import (hostname_db, name_db, password_db,
-                                         port, username_db)
-from disease_trend_system.services.create_data_trend import TrendDetector
-from disease_trend_system.services.fake_name_service import \
-    generate_fake_symptom_complex_name
-from disease_trend_system.services.symptom_complexes_dao import SymptomsDAO
+from disease_trend_system.services.symptom_complexes_dao import \
+    get_symptoms_dao
+from disease_trend_system.services.table_query import apply_table_query
+from disease_trend_system.services.trends_pipeline import get_trends_pipeline
 
 
 def pprint_json(json_str: str) -> str:
@@ -38,50 +36,60 @@ def pprint_json(json_str: str) -> str:
 
 @app.callback(
     Output("table-1", "data"),
+    Output("table-1", "page_count"),
     Input("btn-2", "n_clicks"),
     Input("date-range-2", "start_date"),
     Input("date-range-2", "end_date"),
+    Input("table-1", "page_current"),
+    Input("table-1", "page_size"),
+    Input("table-1", "sort_by"),
+    Input("table-1", "filter_query"),
     State("id_threshold_input-2", "value"),
     State("dropdown-city-2", "value"),
     State("dropdown-region-2", "value"),
     State("dropdown-hospital-2", "value")
 )
 def update_table(n_clicks: int, start_date: datetime,
-                 end_date: datetime, input_thresold: int,
-                 city: str, region: str,
+                 end_date: datetime, page_current: int, page_size: int,
+                 sort_by: List[Dict[str, str]], filter_query: str,
+                 input_thresold: int, city: str, region: str,
                  hospital: str):
-    """Обновление графика трендов
+    """Обновление таблицы трендов
+
+    Фильтрация, сортировка и разбиение на страницы выполняются на сервере
+    по закешированному результату конвейера трендов, в браузер уходит
+    только текущая страница.
 
     Args:
         n_clicks (int): Нажатие на кнопку
         start_date (datetime): Начала периода
         end_date (datetime): Конец периода
+        page_current (int): Номер страницы
+        page_size (int): Размер страницы
+        sort_by (List[Dict[str, str]]): Сортировка таблицы
+        filter_query (str): Фильтр таблицы
         input_thresold (int): Порог тренда
 
     Raises:
         PreventUpdate: Не обновлять
 
     Returns:
-        Figure: Объект Figure
+        Tuple[List[Dict], int]: Строки страницы и число страниц
     """
     if input_thresold is None:
         raise PreventUpdate
-    symptom_dao = SymptomsDAO(
-        username_db, password_db, hostname_db, port, name_db)
-
-    df = symptom_dao.get_trends_data(
-        start_date, end_date, city, region, hospital)
-    df = TrendDetector(input_thresold).execute(df)
-    if not df.empty:
-        df["symptom_complex_hash"] = df["symptom_complex_hash"].apply(
-            generate_fake_symptom_complex_name)
-    df["extra"] = df["extra"].apply(pprint_json)
+
+    df = get_trends_pipeline().run(
+        start_date, end_date, city, region, hospital, input_thresold)
     df["percent_people"] = df["percent_people"]/100
+    page, page_count = apply_table_query(
+        df, filter_query, sort_by, page_current, page_size)
 
-    if df.empty:
-        return []
+    if page.empty:
+        return [], page_count
 
-    return df.to_dict('records')
+    page = page.assign(extra=page["extra"].apply(pprint_json))
+    return page.to_dict('records'), page_count
 
 
 @app.callback(
@@ -96,8 +104,7 @@ def update_dropdown_cities_2(city: str):
     """
     if city == '':
         return []
-    symptom_dao = SymptomsDAO(
-        username_db, password_db, hostname_db, port, name_db)
+    symptom_dao = get_symptoms_dao()
     return symptom_dao.get_regions_by_city(city)
 
 
@@ -115,6 +122,5 @@ def update_dropdown_hospitals_2(city: str, region: str):
     """
     if city == '' or region == '':
         return []
-    symptom_dao = SymptomsDAO(
-        username_db, password_db, hostname_db, port, name_db)
+    symptom_dao = get_symptoms_dao()
     return symptom_dao.get_hospitals_by_city_region(city, region)
@@ -10,6 +10,44 @@ password_db = os.getenv("PASSWORD_DB")
 port = 3306
 name_db = os.getenv("NAME_DB")
 
+pool_size_db = int(os.getenv("POOL_SIZE_DB", "5"))
+max_overflow_db = int(os.getenv("MAX_OVERFLOW_DB", "10"))
+pool_recycle_db = int(os.getenv("POOL_RECYCLE_DB", "3600"))
+query_cache_size = int(os.getenv("QUERY_CACHE_SIZE", "500"))
+
+similarity_engine = os.getenv("SIMILARITY_ENGINE", "exact")
+similarity_radius = int(os.getenv("SIMILARITY_RADIUS", "1"))
+similarity_threshold = float(os.getenv("SIMILARITY_THRESHOLD", "0.5"))
+minhash_permutations = int(os.getenv("MINHASH_PERMUTATIONS", "32"))
+minhash_bands = int(os.getenv("MINHASH_BANDS", "16"))
+similarity_index_lookback = int(os.getenv("SIMILARITY_INDEX_LOOKBACK", "1000"))
+
+batch_max_size = int(os.getenv("BATCH_MAX_SIZE", "5000"))
+batch_max_bytes = int(os.getenv("BATCH_MAX_BYTES", str(16 * 1024 * 1024)))
+symptom_hash_cache_size = int(os.getenv("SYMPTOM_HASH_CACHE_SIZE", "100000"))
+
+ingest_async = os.getenv("INGEST_ASYNC", "false").lower() in ("1", "true", "yes")
+ingest_queue_size = int(os.getenv("INGEST_QUEUE_SIZE", "20000"))
+ingest_group_size = int(os.getenv("INGEST_GROUP_SIZE", "500"))
+ingest_group_age = float(os.getenv("INGEST_GROUP_AGE", "1.0"))
+
+geography_refresh = float(os.getenv("GEOGRAPHY_REFRESH", "30"))
+complex_cache_size = int(os.getenv("COMPLEX_CACHE_SIZE", "200000"))
+
+trends_rollup = os.getenv("TRENDS_ROLLUP", "true").lower() in ("1", "true", "yes")
+trends_cache_entries = int(os.getenv("TRENDS_CACHE_ENTRIES", "128"))
+trends_cache_bytes = int(os.getenv("TRENDS_CACHE_BYTES", str(64 * 1024 * 1024)))
+trends_cache_ttl = float(os.getenv("TRENDS_CACHE_TTL", "60"))
+
+trend_engine = os.getenv("TREND_ENGINE", "threshold")
+trend_window = int(os.getenv("TREND_WINDOW", "5"))
+trend_min_rising = int(os.getenv("TREND_MIN_RISING", "3"))
+trends_parallel_workers = int(os.getenv("TRENDS_PARALLEL_WORKERS",
+                                        str(min(4, os.cpu_count() or 1))))
+trends_parallel_min_rows = int(os.getenv("TRENDS_PARALLEL_MIN_ROWS", "200000"))
+
+rating_window = int(os.getenv("RATING_WINDOW", "30"))
+
 admin_name = os.getenv("ADMIN_NAME")
 admin_username = os.getenv("ADMIN_USERNAME")
 admin_password = os.getenv("ADMIN_PASSWORD")
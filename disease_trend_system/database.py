@@ -0,0 +1,91 @@
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict
+
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from disease_trend_system.config import (hostname_db, max_overflow_db,
+                                         name_db, password_db, pool_recycle_db,
+                                         pool_size_db, port, query_cache_size,
+                                         username_db)
+
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+_statement_cache: Counter = Counter()
+_statement_cache_lock = threading.Lock()
+
+
+def _count_statement_cache(conn: Any, cursor: Any, statement: str, parameters: Any,
+                           context: Any, executemany: bool) -> None:
+    cache_hit = getattr(context, "cache_hit", None)
+    if cache_hit is None:
+        return
+    with _statement_cache_lock:
+        _statement_cache[getattr(cache_hit, "name", str(cache_hit))] += 1
+
+
+def statement_cache_stats() -> Dict[str, Any]:
+    """Счетчики кеша скомпилированных выражений SQLAlchemy в этом процессе
+
+    Returns:
+        Dict[str, Any]: Число выполнений по исходу (CACHE_HIT, CACHE_MISS,
+            NO_CACHE_KEY, ...) и hit_rate - доля попаданий среди
+            кешируемых выражений
+    """
+    with _statement_cache_lock:
+        stats: Dict[str, Any] = dict(_statement_cache)
+    cached = stats.get("CACHE_HIT", 0) + stats.get("CACHE_MISS", 0)
+    stats["hit_rate"] = stats.get("CACHE_HIT", 0) / cached if cached else 0.0
+    return stats
+
+
+def _dispose_engines_after_fork() -> None:
+    """Сброс унаследованных от родителя соединений в дочернем процессе
+    (gunicorn --preload)
+    """
+    for engine in _engines.values():
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_engines_after_fork)
+
+
+def get_engine(usr: str = username_db, pswd: str = password_db,
+               host: str = hostname_db, port: int = port,
+               db: str = name_db) -> Engine:
+    """Получить общий для процесса пул соединений с БД
+
+    Движок создается один раз на воркер и переиспользуется всеми
+    DAO, сессиями и колбэками.
+
+    Args:
+        usr (str): Пользователь
+        pswd (str): Пароль
+        host (str): Хост
+        port (int): Порт
+        db (str): База данных
+
+    Returns:
+        Engine: Движок SQLAlchemy с пулом соединений
+    """
+    url = f"mysql+pymysql://{usr}:{pswd}@{host}:{port}/{db}"
+    engine = _engines.get(url)
+    if engine is not None:
+        return engine
+    with _engines_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = sqlalchemy.create_engine(
+                url,
+                pool_pre_ping=True,
+                pool_size=pool_size_db,
+                max_overflow=max_overflow_db,
+                pool_recycle=pool_recycle_db,
+                query_cache_size=query_cache_size)
+            event.listen(engine, "before_cursor_execute", _count_statement_cache)
+            _engines[url] = engine
+    return engine
@@ -1,42 +1,230 @@
+import json
+import math
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypedDict
+
 from flask import request
-from flask_restful import Resource, inputs, reqparse
+from flask_restful import Resource, inputs
 
-from disease_trend_system.config import (hostname_db, name_db, password_db,
-                                         port, username_db)
+from disease_trend_system.config import (batch_max_bytes, batch_max_size,
+                                         ingest_async)
+from disease_trend_system.services.ingest_queue import get_ingest_queue
 from disease_trend_system.services.symptom_complex_transform import \
     SymtomComplexTransform
-from disease_trend_system.services.symptom_complexes_dao import SymptomsDAO
+from disease_trend_system.services.symptom_complexes_dao import \
+    get_symptoms_dao
+
+def people_count(value: Any) -> int:
+    """Число людей: дробное значение округляется один раз при проверке
+
+    В наблюдение и в дневной агрегат записывается одно и то же целое, поэтому
+    агрегаты, пересчитанные migrate --rebuild-rollups, совпадают с
+    обновленными при записи.
+
+    Args:
+        value (Any): Значение из запроса
+
+    Returns:
+        int: Число людей
+    """
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"total_number_people must be finite: {value!r}")
+    return round(number)
+
+
+SYMPTOM_COMPLEX_FIELDS = (
+    ("symptoms", dict),
+    ("percent_people", float),
+    ("city", str),
+    ("region", str),
+    ("hospital", str),
+    ("total_number_people", people_count),
+    ("date_symptoms", inputs.datetime_from_iso8601),
+)
+
+# текст RequestParser для параметров по умолчанию (location json и values)
+MISSING_PARAMETER = ("Missing required parameter in the JSON body or the post body "
+                     "or the query string")
+
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/ndjson",
+                    "application/jsonl")
+
+
+class SymptomComplex(TypedDict):
+    """Симптомокомлекс из тела запроса после проверки и приведения типов
+    """
+    symptoms: Dict[str, Any]
+    percent_people: float
+    city: str
+    region: str
+    hospital: str
+    total_number_people: int
+    date_symptoms: datetime
+
+
+class SymptomComplexValidator:
+    """Проверка симптомокомлекса, собирается один раз при импорте
+
+    За один проход по полям проверяет наличие, приводит типы и возвращает
+    запись с приведенными значениями. Названия и строковые значения
+    признаков приводятся к нижнему регистру до расчета хешей.
+    """
+
+    def __init__(self, fields: Tuple[Tuple[str, Callable[[Any], Any]], ...]) -> None:
+        self.fields = tuple(fields)
+
+    def validate(self, symptom_complex: Any, bundle_errors: bool = True
+                 ) -> Tuple[Optional[SymptomComplex], Optional[Dict[str, str]]]:
+        """Проверить симптомокомлекс
+
+        Args:
+            symptom_complex (Any): Симптомокомлекс из тела запроса
+            bundle_errors (bool): Собрать ошибки всех полей, иначе остановиться
+                на первой (как RequestParser)
+
+        Returns:
+            Tuple[Optional[SymptomComplex], Optional[Dict[str, str]]]: Запись
+                или ошибки по полям
+        """
+        if not isinstance(symptom_complex, dict):
+            return None, {"body": "Symptom complex must be a JSON object"}
+        record = {}
+        errors = {}
+        for name, type_ in self.fields:
+            value = symptom_complex.get(name)
+            if value is None:
+                errors[name] = MISSING_PARAMETER
+            else:
+                try:
+                    record[name] = type_(value)
+                except (TypeError, ValueError) as error:
+                    errors[name] = str(error)
+            if errors and not bundle_errors:
+                return None, errors
+        if "symptoms" in record and not record["symptoms"]:
+            errors["symptoms"] = "Can't contains symptoms"
+        if errors:
+            return None, errors
+        record["symptoms"] = SymtomComplexTransform.lower_symptoms(record["symptoms"])
+        return record, None
+
+
+SYMPTOM_COMPLEX_VALIDATOR = SymptomComplexValidator(SYMPTOM_COMPLEX_FIELDS)
+
+
+def read_json_body() -> Any:
+    """Разбор тела запроса как JSON без проверки mimetype и кеширования тела
+
+    В отличие от RequestParser значения из формы и строки запроса не
+    читаются: признаки (symptoms) - словарь и могут прийти только в JSON,
+    поэтому такие запросы и раньше отклонялись с кодом 400.
+
+    Raises:
+        ValueError: Тело не JSON
+
+    Returns:
+        Any: Разобранное тело
+    """
+    return json.loads(request.get_data(cache=False))
 
 
 class SymptomsResource(Resource):
     """Ендоинт для сохранения сиптомокомлексов
     """
 
-    def __init__(self):
-        self.parser = reqparse.RequestParser()
-        self.parser.add_argument("symptoms", type=dict, required=True)
-        self.parser.add_argument("percent_people", type=float, required=True)
-        self.parser.add_argument("city", type=str, required=True)
-        self.parser.add_argument("region", type=str, required=True)
-        self.parser.add_argument("hospital", type=str, required=True)
-        self.parser.add_argument(
-            "total_number_people", type=float, required=True)
-        self.parser.add_argument(
-            "date_symptoms", type=inputs.datetime_from_iso8601, required=True)
-
     def post(self):
-        _ = self.parser.parse_args()
-        symptom_complex = request.get_json()
-
         try:
-            _ = symptom_complex["symptoms"]
-        except KeyError as _:
-            return {"message": "Can't contains symptoms"}
-        else:
-            symptoms = SymtomComplexTransform.symptom_complex_to_symptoms(
-                symptom_complex)
-            symptom_dao = SymptomsDAO(
-                username_db, password_db, hostname_db, port, name_db)
-            symptom_dao.save_symptoms(symptoms)
+            body = read_json_body()
+        except ValueError as _:
+            return {"message": "Failed to decode JSON object"}, 400
+        symptom_complex, errors = SYMPTOM_COMPLEX_VALIDATOR.validate(
+            body, bundle_errors=False)
+        if errors is not None:
+            return {"message": errors}, 400
+
+        symptoms = SymtomComplexTransform.symptom_complex_to_symptoms(
+            symptom_complex)
+        if ingest_async:
+            if not get_ingest_queue().put([symptoms]):
+                return {"message": "Ingest queue is full"}, 429
+            return {"message": "accepted"}, 202
+        symptom_dao = get_symptoms_dao()
+        symptom_dao.save_symptoms(symptoms)
 
         return {'message': 'successfull added'}
+
+
+class SymptomsBatchResource(Resource):
+    """Ендпоинт для пакетного сохранения симптомокомлексов
+
+    Принимает JSON-массив или NDJSON (один симптомокомлекс на строку),
+    сохраняет все корректные элементы одной транзакцией и возвращает
+    статус по каждому элементу.
+    """
+
+    @staticmethod
+    def _read_items() -> Optional[List[Any]]:
+        """Чтение элементов пачки из тела запроса
+
+        NDJSON читается построчно из потока и дальше batch_max_size + 1
+        элементов не разбирается.
+
+        Returns:
+            Optional[List[Any]]: Элементы или None, если тело не массив/NDJSON
+        """
+        if request.mimetype in NDJSON_MIMETYPES:
+            items = []
+            for line in request.stream:
+                line = line.strip()
+                if not line:
+                    continue
+                if len(items) > batch_max_size:
+                    break
+                try:
+                    items.append(json.loads(line))
+                except ValueError as _:
+                    items.append(None)
+            return items
+        try:
+            items = read_json_body()
+        except ValueError as _:
+            return None
+        if not isinstance(items, list):
+            return None
+        return items
+
+    def post(self):
+        if request.content_length is not None and request.content_length > batch_max_bytes:
+            return {"message": f"Batch body exceeds {batch_max_bytes} bytes"}, 413
+        items = self._read_items()
+        if items is None:
+            return {"message": "Expected JSON array or NDJSON body"}, 400
+        if len(items) > batch_max_size:
+            return {"message": f"Batch size exceeds {batch_max_size}"}, 413
+
+        results = []
+        batch = []
+        for index, item in enumerate(items):
+            symptom_complex, errors = SYMPTOM_COMPLEX_VALIDATOR.validate(item)
+            if errors is not None:
+                results.append(
+                    {"index": index, "status": "error", "message": errors})
+                continue
+            batch.append(SymtomComplexTransform.symptom_complex_to_symptoms(
+                symptom_complex))
+            results.append({"index": index, "status": "added"})
+
+        if ingest_async:
+            if not get_ingest_queue().put(batch):
+                return {"message": "Ingest queue is full"}, 429
+            for result in results:
+                if result["status"] == "added":
+                    result["status"] = "accepted"
+            return {"message": f"accepted {len(batch)} of {len(items)}",
+                    "results": results}, 202
+
+        get_symptoms_dao().save_symptom_complexes(batch)
+
+        return {"message": f"successfull added {len(batch)} of {len(items)}",
+                "results": results}
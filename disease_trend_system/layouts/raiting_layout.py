@@ -15,6 +15,23 @@ COLUMNS = [
          format=Format(precision=0, scheme=Scheme.fixed)),
     dict(id="extra", name="Описание СК")]
 
+SCORE_COLUMNS = [
+    dict(id="slope_percent", name="Наклон процента людей (в день)", type="numeric",
+         format=Format(precision=3, scheme=Scheme.fixed)),
+    dict(id="slope_total", name="Наклон числа людей (в день)", type="numeric",
+         format=Format(precision=2, scheme=Scheme.fixed)),
+    dict(id="growth", name="Рост числа людей (раз)", type="numeric",
+         format=Format(precision=2, scheme=Scheme.fixed)),
+    dict(id="coverage", name="Доля дней с наблюдениями", type="numeric",
+         format=Format(precision=0, scheme=Scheme.percentage))]
+
+METRIC_OPTIONS = [
+    dict(label="Продолжительность", value="days"),
+    dict(label="Наклон процента людей", value="slope_percent"),
+    dict(label="Наклон числа людей", value="slope_total"),
+    dict(label="Рост числа людей", value="growth"),
+    dict(label="Доля дней с наблюдениями", value="coverage")]
+
 MAX_PAGE_SIZE = 50
 
 
@@ -24,7 +41,9 @@ def raiting_layout():
         dbc.Row([
             dbc.Col([html.P("Выберите дату"),
                      dcc.DatePickerSingle(id="date-range-3", date=datetime.now())]),
-            dbc.Col(),
+            dbc.Col([html.P("Ранжировать по"),
+                     dcc.Dropdown(id="dropdown-metric-3", options=METRIC_OPTIONS,
+                                  value="days", clearable=False)]),
             dbc.Col(),
             dbc.Col()
         ]),
@@ -32,11 +51,14 @@ def raiting_layout():
         dbc.Row(html.H2(id="header-report")),
         dbc.Row([dash_table.DataTable(data=[], id="table-2",
                                       columns=COLUMNS,
-                                      filter_action="native",
-                                      sort_action="native",
+                                      filter_action="custom",
+                                      filter_query="",
+                                      sort_action="custom",
                                       sort_mode="multi",
-                                      page_action="native",
+                                      sort_by=[],
+                                      page_action="custom",
                                       page_current=0,
+                                      page_count=1,
                                       page_size=MAX_PAGE_SIZE,
                                       style_table={
                                           'height': '70vh', 'overflowY': 'auto'},
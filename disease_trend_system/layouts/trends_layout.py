@@ -4,11 +4,10 @@ from typing import List
 
 import dash_bootstrap_components as dbc
 import plotly.graph_objs as go
-from dash import dcc, html
+from dash import dash_table, dcc, html
 
-from disease_trend_system.config import (hostname_db, name_db, password_db,
-                                         port, username_db)
-from disease_trend_system.services.symptom_complexes_dao import SymptomsDAO
+from disease_trend_system.services.symptom_complexes_dao import \
+    get_symptoms_dao
 
 
 def get_start_date() -> datetime:
@@ -33,10 +32,14 @@ def get_end_date() -> datetime:
 
 fig = go.Figure(data=[])
 
+TRENDING_COLUMNS = [
+    dict(id="symptom_complex_hash", name="ИД СК"),
+    dict(id="segment_start", name="Начало тренда"),
+    dict(id="last_day", name="Последний день наблюдений")]
+
 
 def get_cities() -> List[str]:
-    symptom_dao = SymptomsDAO(
-        username_db, password_db, hostname_db, port, name_db)
+    symptom_dao = get_symptoms_dao()
     return symptom_dao.get_cities()
 
 
@@ -80,6 +83,23 @@ def trends_layout():
                 clear_on_unhover=True),
             dcc.Tooltip(id="graph-tooltip")]),
         dbc.Row(html.Br()),
+        dbc.Row(html.H4("Сейчас в тренде (по всем местам)")),
+        dbc.Row([dash_table.DataTable(data=[], id="table-trending-1",
+                                      columns=TRENDING_COLUMNS,
+                                      sort_action="native",
+                                      page_size=20,
+                                      style_header={
+            'backgroundColor': '#6A5ACD',
+            'fontWeight': 'bold',
+            'color': "white"
+        },
+            style_data_conditional=[
+            {
+                'if': {'row_index': 'odd'},
+                'backgroundColor': 'rgb(220, 220, 220)',
+            }
+        ])]),
+        dbc.Row(html.Br()),
         dbc.Row(html.Br()),
         dbc.Row(html.Br()),
         dbc.Row(html.Br()),
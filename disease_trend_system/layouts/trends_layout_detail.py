@@ -7,9 +7,8 @@ import plotly.graph_objs as go
 from dash import dash_table, dcc, html
 from dash.dash_table.Format import Format, Scheme
 
-from disease_trend_system.config import (hostname_db, name_db, password_db,
-                                         port, username_db)
-from disease_trend_system.services.symptom_complexes_dao import SymptomsDAO
+from disease_trend_system.services.symptom_complexes_dao import \
+    get_symptoms_dao
 
 COLUMNS = [
     dict(id="symptom_complex_hash", name="ИД СК"),
@@ -44,8 +43,7 @@ def get_end_date() -> datetime:
 
 
 def get_cities() -> List[str]:
-    symptom_dao = SymptomsDAO(
-        username_db, password_db, hostname_db, port, name_db)
+    symptom_dao = get_symptoms_dao()
     return symptom_dao.get_cities()
 
 
@@ -89,11 +87,14 @@ def trends_layout_detail():
 
         dbc.Row([dash_table.DataTable(data=[], id="table-1",
                                       columns=COLUMNS,
-                                      filter_action="native",
-                                      sort_action="native",
+                                      filter_action="custom",
+                                      filter_query="",
+                                      sort_action="custom",
                                       sort_mode="multi",
-                                      page_action="native",
+                                      sort_by=[],
+                                      page_action="custom",
                                       page_current=0,
+                                      page_count=1,
                                       page_size=MAX_PAGE_SIZE,
                                       style_table={
                                           'height': '70vh', 'overflowY': 'auto'},
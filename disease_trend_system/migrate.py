@@ -0,0 +1,662 @@
+"""Версионные миграции схемы БД
+
+Запуск: python -m disease_trend_system.migrate [--status] [--target N]
+    [--renormalize] [--rebuild-rollups] [--rebuild-trend-states]
+
+Примененные версии записываются в таблицу schema_version, каждая миграция
+выполняется отдельной транзакцией. DDL в MySQL не транзакционен, поэтому
+миграции схемы проверяют наличие таблиц и индексов и безопасны при повторе.
+"""
+import argparse
+import ast
+import json
+from collections import Counter
+from dataclasses import dataclass
+from itertools import groupby
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import (Column, DateTime, Double, ForeignKey, Index, Integer,
+                        MetaData, String, Table, Text, delete, func, insert,
+                        bindparam, inspect, literal, select, text,
+                        type_coerce, update)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy_utils import JSONType
+
+from disease_trend_system.config import trend_min_rising, trend_window
+from disease_trend_system.database import get_engine
+from disease_trend_system.models import (Base, Complex, ComplexSymptom,
+                                         DailyRollup, DailyRollupSource,
+                                         DataGeneration,
+                                         Location, Observation, RatingSnapshot,
+                                         RatingSnapshotDay, SchemaVersion, Symptom,
+                                         SymptomComplexes, TrendState)
+from disease_trend_system.services.daily_rollup import rebuild_rollups
+from disease_trend_system.services.data_generation import bump_generation
+from disease_trend_system.services.trend_state import rebuild_trend_states
+from disease_trend_system.services.symptom_complex_transform import \
+    SymtomComplexTransform
+
+CHUNK_SIZE = 5000
+
+LEGACY = SymptomComplexes.__table__
+SYMPTOMS = Symptom.__table__
+COMPLEXES = Complex.__table__
+COMPLEX_SYMPTOMS = ComplexSymptom.__table__
+OBSERVATIONS = Observation.__table__
+SCHEMA_VERSION = SchemaVersion.__table__
+DAILY_ROLLUPS = DailyRollup.__table__
+DAILY_ROLLUP_SOURCES = DailyRollupSource.__table__
+TREND_STATES = TrendState.__table__
+DATA_GENERATION = DataGeneration.__table__
+LOCATIONS = Location.__table__
+RATING_SNAPSHOTS = RatingSnapshot.__table__
+RATING_SNAPSHOT_DAYS = RatingSnapshotDay.__table__
+
+REPORT_COLUMNS = ("date", "total_number", "percent_people",
+                  "city", "region", "hospital")
+
+# таблицы версии 1 в том виде, в каком они были на момент этой версии;
+# колонки и индексы, появившиеся в models позже, добавляют следующие миграции
+V1_METADATA = MetaData()
+V1_USERS = Table(
+    "users", V1_METADATA,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(100)),
+    Column("username", String(50), nullable=False, unique=True),
+    Column("email", String(100), nullable=False, unique=True),
+    Column("password", String(120), nullable=False),
+    Column("role", Integer, nullable=False),
+    Column("created_on", DateTime),
+    Column("updated_on", DateTime))
+V1_LEGACY = Table(
+    "symptom_complexes", V1_METADATA,
+    Column("id", Integer, primary_key=True),
+    Column("total_number", Integer, nullable=False),
+    Column("date", DateTime, nullable=False),
+    Column("percent_people", Double, nullable=False),
+    Column("city", String(64), nullable=False),
+    Column("region", String(128), nullable=False),
+    Column("hospital", String(128), nullable=False),
+    Column("extra", JSONType, nullable=False),
+    Column("symptom_hash", String(32), nullable=False),
+    Column("symptom_complex_hash", String(32), nullable=False))
+V1_SYMPTOMS = Table(
+    "symptoms", V1_METADATA,
+    Column("id", Integer, primary_key=True),
+    Column("symptom_hash", String(32), nullable=False, unique=True),
+    Column("extra", Text, nullable=False))
+V1_COMPLEXES = Table(
+    "complexes", V1_METADATA,
+    Column("id", Integer, primary_key=True),
+    Column("symptom_complex_hash", String(32), nullable=False, unique=True),
+    Column("symptom_count", Integer, nullable=False))
+V1_COMPLEX_SYMPTOMS = Table(
+    "complex_symptoms", V1_METADATA,
+    Column("complex_id", Integer, ForeignKey("complexes.id"), primary_key=True),
+    Column("symptom_id", Integer, ForeignKey("symptoms.id"), primary_key=True))
+V1_OBSERVATIONS = Table(
+    "observations", V1_METADATA,
+    Column("id", Integer, primary_key=True),
+    Column("complex_id", Integer, ForeignKey("complexes.id"), nullable=False),
+    Column("source_complex_id", Integer, ForeignKey("complexes.id"), nullable=False),
+    Column("total_number", Integer, nullable=False),
+    Column("date", DateTime, nullable=False),
+    Column("percent_people", Double, nullable=False),
+    Column("city", String(64), nullable=False),
+    Column("region", String(128), nullable=False),
+    Column("hospital", String(128), nullable=False))
+
+
+def parse_legacy_extra(extra: Any) -> Dict[str, Any]:
+    """Разбор поля extra старой таблицы
+
+    В зависимости от пути вставки там лежит JSON-объект {"признак": "значение"}
+    или repr словаря Python {'признак': 'значение'}.
+
+    Args:
+        extra (Any): Значение extra
+
+    Returns:
+        Dict[str, Any]: Признак и значение
+    """
+    try:
+        value = json.loads(extra)
+    except ValueError as _:
+        value = ast.literal_eval(extra)
+    if isinstance(value, str):
+        return parse_legacy_extra(value)
+    return value
+
+
+class LegacyMigration:
+    """Перенос строк symptom_complexes в symptoms/complexes/observations
+
+    Строки одного отчета (одинаковые хеш симптомокомлекса, дата, число людей,
+    процент и место) собираются в одно наблюдение. Набор признаков отчета
+    восстанавливается из extra, его хеш пересчитывается тем же
+    SymtomComplexTransform._dict_hash, что и при приеме данных.
+
+    Уже сохраненные признаки и симптомокомлексы переиспользуются по хешу,
+    их id не меняются: воркеры держат id в памяти (ComplexIdCache).
+    """
+
+    def __init__(self, conn: Connection) -> None:
+        self.conn = conn
+        self.symptom_ids: Dict[str, int] = dict(conn.execute(
+            select(SYMPTOMS.c.symptom_hash, SYMPTOMS.c.id)).all())
+        self.complex_ids: Dict[str, int] = dict(conn.execute(
+            select(COMPLEXES.c.symptom_complex_hash, COMPLEXES.c.id)).all())
+        self.filled_complexes: Set[str] = set()
+        self.observations: List[Dict[str, Any]] = []
+        self.observation_count = 0
+
+    def _symptom_id(self, symptom_hash: str, extra: Dict[str, Any]) -> int:
+        symptom_id = self.symptom_ids.get(symptom_hash)
+        if symptom_id is None:
+            symptom_id = self.conn.execute(insert(SYMPTOMS).values(
+                symptom_hash=symptom_hash,
+                extra=json.dumps(extra, ensure_ascii=False))).inserted_primary_key[0]
+            self.symptom_ids[symptom_hash] = symptom_id
+        return symptom_id
+
+    def _complex_id(self, symptom_complex_hash: str,
+                    symptom_ids: Optional[List[int]] = None) -> int:
+        """id симптомокомлекса, при необходимости создается
+
+        Симптомокомлекс, встреченный только как похожий, создается без
+        признаков и получает их, когда встретятся его собственные строки.
+
+        Args:
+            symptom_complex_hash (str): Хеш симптомокомлекса
+            symptom_ids (Optional[List[int]]): Признаки, если известны
+
+        Returns:
+            int: id симптомокомлекса
+        """
+        complex_id = self.complex_ids.get(symptom_complex_hash)
+        if complex_id is None:
+            complex_id = self.conn.execute(insert(COMPLEXES).values(
+                symptom_complex_hash=symptom_complex_hash,
+                symptom_count=0)).inserted_primary_key[0]
+            self.complex_ids[symptom_complex_hash] = complex_id
+        if symptom_ids and symptom_complex_hash not in self.filled_complexes:
+            self.conn.execute(update(COMPLEXES).where(
+                COMPLEXES.c.id == complex_id).values(symptom_count=len(symptom_ids)))
+            self.conn.execute(insert(COMPLEX_SYMPTOMS).prefix_with("IGNORE"),
+                              [{"complex_id": complex_id, "symptom_id": symptom_id}
+                               for symptom_id in symptom_ids])
+            self.filled_complexes.add(symptom_complex_hash)
+        return complex_id
+
+    def _flush(self) -> None:
+        if self.observations:
+            self.conn.execute(insert(OBSERVATIONS), self.observations)
+            self.observation_count += len(self.observations)
+            self.observations = []
+
+    def add_report(self, symptom_complex_hash: str, report: Dict[str, Any],
+                   rows: List[Any]) -> None:
+        """Перенос строк одного отчета
+
+        Args:
+            symptom_complex_hash (str): Хеш, под которым сохранены строки
+            report (Dict[str, Any]): Общие поля отчета
+            rows (List[Any]): Строки (symptom_hash, extra)
+        """
+        extras = {}
+        for symptom_hash, extra in rows:
+            if symptom_hash not in extras:
+                extras[symptom_hash] = parse_legacy_extra(extra)
+        symptoms = {}
+        for extra in extras.values():
+            symptoms.update(extra)
+        source_hash = SymtomComplexTransform._dict_hash(symptoms)
+        symptom_ids = [self._symptom_id(symptom_hash, extra)
+                       for symptom_hash, extra in extras.items()]
+        source_id = self._complex_id(source_hash, symptom_ids)
+        complex_id = self._complex_id(symptom_complex_hash)
+        # одинаковые отчеты, присланные несколько раз, дают кратные строки
+        repeats = min(Counter(symptom_hash for symptom_hash, _ in rows).values())
+        for _ in range(repeats):
+            self.observations.append(dict(
+                report, complex_id=complex_id, source_complex_id=source_id))
+        if len(self.observations) >= CHUNK_SIZE:
+            self._flush()
+
+    def run(self, engine: Engine) -> None:
+        """Потоковое чтение старой таблицы и перенос отчетов
+
+        Args:
+            engine (Engine): Движок (для отдельного читающего соединения)
+        """
+        key_columns = [LEGACY.c.symptom_complex_hash] + \
+            [LEGACY.c[name] for name in REPORT_COLUMNS]
+        query = select(*key_columns, LEGACY.c.symptom_hash,
+                       type_coerce(LEGACY.c.extra, Text).label("extra")).order_by(
+            *key_columns, LEGACY.c.id)
+        with engine.connect() as reader:
+            result = reader.execution_options(
+                stream_results=True, yield_per=CHUNK_SIZE).execute(query)
+            for key, rows in groupby(result, key=lambda row: tuple(row[:7])):
+                report = dict(zip(REPORT_COLUMNS, key[1:]))
+                self.add_report(key[0], report,
+                                [(row.symptom_hash, row.extra) for row in rows])
+        self._flush()
+
+
+def normalize_symptom_complexes(conn: Connection, force: bool = False) -> None:
+    """Перенос symptom_complexes в нормализованную схему
+
+    Старая таблица не изменяется, наблюдения перед переносом удаляются.
+    Признаки и симптомокомлексы не удаляются и сохраняют id, поэтому
+    повторный перенос (--renormalize) можно выполнять при работающих
+    воркерах: он увеличивает поколение данных, и воркеры перестраивают
+    структуры в памяти перед следующей записью.
+
+    Args:
+        conn (Connection): Соединение с открытой транзакцией
+        force (bool): Перезаписать наблюдения, даже если они уже есть
+    """
+    observations = conn.execute(select(func.count()).select_from(OBSERVATIONS)).scalar()
+    if observations and not force:
+        print(f"observations already contains {observations} rows, "
+              "use --renormalize to overwrite")
+        return
+    conn.execute(delete(OBSERVATIONS))
+    migration = LegacyMigration(conn)
+    migration.run(conn.engine)
+    print(f"symptoms: {len(migration.symptom_ids)}, "
+          f"complexes: {len(migration.complex_ids)}, "
+          f"observations: {migration.observation_count}")
+
+
+def _survivors(new_hashes: Dict[int, str], hash_ids: Dict[str, int]) -> Dict[int, int]:
+    """Строки с одинаковым новым хешем сливаются в одну
+
+    Остается строка, у которой уже такой хеш, иначе строка с меньшим id,
+    чтобы id, известные воркерам, по возможности сохранились.
+
+    Args:
+        new_hashes (Dict[int, str]): id -> новый хеш
+        hash_ids (Dict[str, int]): Текущий хеш -> id для всех строк таблицы
+
+    Returns:
+        Dict[int, int]: id -> id оставшейся строки (у оставшейся - свой id)
+    """
+    groups: Dict[str, List[int]] = {}
+    for row_id, new_hash in new_hashes.items():
+        groups.setdefault(new_hash, []).append(row_id)
+    survivors = {}
+    for new_hash, ids in groups.items():
+        survivor = hash_ids.get(new_hash)
+        if survivor is None or new_hashes.get(survivor, new_hash) != new_hash:
+            survivor = min(ids)
+        for row_id in ids:
+            survivors[row_id] = survivor
+    return survivors
+
+
+def _move_complex_symptoms(conn: Connection, column: str, old_id: int, new_id: int) -> None:
+    """Перенести связи complex_symptoms со слитой строки на оставшуюся
+    """
+    other = "symptom_id" if column == "complex_id" else "complex_id"
+    moved = select(COMPLEX_SYMPTOMS.c[other], literal(new_id)).where(
+        COMPLEX_SYMPTOMS.c[column] == old_id)
+    conn.execute(insert(COMPLEX_SYMPTOMS).prefix_with("IGNORE").from_select(
+        [other, column], moved))
+    conn.execute(delete(COMPLEX_SYMPTOMS).where(COMPLEX_SYMPTOMS.c[column] == old_id))
+
+
+def _lowercase_symptom_rows(conn: Connection) -> Tuple[int, int]:
+    """Признаки symptoms в нижнем регистре, совпавшие признаки сливаются
+
+    Returns:
+        Tuple[int, int]: Число измененных и число слитых строк
+    """
+    rows = conn.execute(select(SYMPTOMS.c.id, SYMPTOMS.c.symptom_hash,
+                               SYMPTOMS.c.extra)).all()
+    extras = {row.id: SymtomComplexTransform.lower_symptoms(json.loads(row.extra))
+              for row in rows}
+    new_hashes = {row_id: SymtomComplexTransform._dict_hash(extra)
+                  for row_id, extra in extras.items()}
+    survivors = _survivors(new_hashes, {row.symptom_hash: row.id for row in rows})
+    changed = [{"b_id": row.id, "b_hash": new_hashes[row.id],
+                "b_extra": json.dumps(extras[row.id], ensure_ascii=False)}
+               for row in rows
+               if survivors[row.id] == row.id and (
+                   row.symptom_hash != new_hashes[row.id] or
+                   json.loads(row.extra) != extras[row.id])]
+    merged = [row_id for row_id, survivor in survivors.items() if survivor != row_id]
+    for row_id in merged:
+        _move_complex_symptoms(conn, "symptom_id", row_id, survivors[row_id])
+    if merged:
+        conn.execute(delete(SYMPTOMS).where(SYMPTOMS.c.id.in_(merged)))
+    if changed:
+        conn.execute(update(SYMPTOMS).where(SYMPTOMS.c.id == bindparam("b_id")).values(
+            symptom_hash=bindparam("b_hash"), extra=bindparam("b_extra")), changed)
+    return len(changed), len(merged)
+
+
+def _lowercase_complex_rows(conn: Connection) -> Tuple[int, int]:
+    """Хеши complexes по признакам в нижнем регистре, совпавшие
+    симптомокомлексы сливаются
+
+    Симптомокомлексы без признаков (встреченные только как похожие) не
+    меняются. Наблюдения слитых строк переносятся на оставшуюся, их
+    агрегаты, состояния трендов и снимки рейтинга удаляются и должны быть
+    пересчитаны.
+
+    Returns:
+        Tuple[int, int]: Число измененных и число слитых строк
+    """
+    rows = conn.execute(select(COMPLEXES.c.id, COMPLEXES.c.symptom_complex_hash,
+                               COMPLEXES.c.symptom_count)).all()
+    query = select(COMPLEX_SYMPTOMS.c.complex_id, SYMPTOMS.c.extra).join_from(
+        COMPLEX_SYMPTOMS, SYMPTOMS).order_by(COMPLEX_SYMPTOMS.c.complex_id)
+    new_hashes: Dict[int, str] = {}
+    counts: Dict[int, int] = {}
+    for complex_id, extras in groupby(conn.execute(query), key=lambda row: row.complex_id):
+        symptoms: Dict[str, Any] = {}
+        count = 0
+        for row in extras:
+            symptoms.update(json.loads(row.extra))
+            count += 1
+        new_hashes[complex_id] = SymtomComplexTransform._dict_hash(symptoms)
+        counts[complex_id] = count
+    survivors = _survivors(new_hashes,
+                           {row.symptom_complex_hash: row.id for row in rows})
+    merged = [row_id for row_id, survivor in survivors.items() if survivor != row_id]
+    for row_id in merged:
+        survivor = survivors[row_id]
+        counts.setdefault(survivor, counts[row_id])
+        _move_complex_symptoms(conn, "complex_id", row_id, survivor)
+        for column in ("complex_id", "source_complex_id"):
+            conn.execute(update(OBSERVATIONS).where(
+                OBSERVATIONS.c[column] == row_id).values({column: survivor}))
+    changed = [{"b_id": row.id, "b_hash": new_hashes[row.id], "b_count": counts[row.id]}
+               for row in rows
+               if survivors.get(row.id) == row.id and (
+                   row.symptom_complex_hash != new_hashes[row.id] or
+                   row.symptom_count != counts[row.id])]
+    changed.extend({"b_id": row.id, "b_hash": row.symptom_complex_hash,
+                    "b_count": counts[row.id]}
+                   for row in rows
+                   if row.id not in survivors and row.id in counts)
+    if merged:
+        conn.execute(delete(DAILY_ROLLUP_SOURCES).where(
+            DAILY_ROLLUP_SOURCES.c.complex_id.in_(merged) |
+            DAILY_ROLLUP_SOURCES.c.source_complex_id.in_(merged)))
+        for table in (DAILY_ROLLUPS, TREND_STATES, RATING_SNAPSHOTS):
+            conn.execute(delete(table).where(table.c.complex_id.in_(merged)))
+        conn.execute(delete(COMPLEXES).where(COMPLEXES.c.id.in_(merged)))
+    if changed:
+        conn.execute(update(COMPLEXES).where(COMPLEXES.c.id == bindparam("b_id")).values(
+            symptom_complex_hash=bindparam("b_hash"), symptom_count=bindparam("b_count")),
+            changed)
+    return len(changed), len(merged)
+
+
+def lowercase_symptoms(conn: Connection) -> int:
+    """Привести сохраненные признаки к нижнему регистру, как при приеме данных
+
+    Хеши признаков и симптомокомлексов пересчитываются, строки с совпавшим
+    хешем сливаются. Вызывающий пересчитывает агрегаты и увеличивает
+    поколение данных, если что-то изменилось.
+
+    Args:
+        conn (Connection): Соединение с открытой транзакцией
+
+    Returns:
+        int: Число измененных и слитых строк symptoms и complexes
+    """
+    symptoms_changed, symptoms_merged = _lowercase_symptom_rows(conn)
+    complexes_changed, complexes_merged = _lowercase_complex_rows(conn)
+    print(f"lower-case symptoms: {symptoms_changed} changed, {symptoms_merged} merged; "
+          f"complexes: {complexes_changed} changed, {complexes_merged} merged")
+    return symptoms_changed + symptoms_merged + complexes_changed + complexes_merged
+
+
+def create_tables(conn: Connection, *tables: Table) -> None:
+    """Создать недостающие таблицы вместе с их индексами
+
+    Args:
+        conn (Connection): Соединение
+        tables (Table): Таблицы
+    """
+    Base.metadata.create_all(conn, tables=list(tables))
+
+
+def create_index(conn: Connection, table: Table, name: str, *columns: str) -> None:
+    """Создать индекс, если его еще нет в БД
+
+    Args:
+        conn (Connection): Соединение
+        table (Table): Таблица
+        name (str): Имя индекса
+        columns (str): Колонки индекса
+    """
+    if not _has_index(conn, table, name):
+        Index(name, *[table.c[column] for column in columns]).create(conn)
+
+
+def drop_index(conn: Connection, table: Table, name: str) -> None:
+    """Удалить индекс, если он есть в БД
+
+    Args:
+        conn (Connection): Соединение
+        table (Table): Таблица
+        name (str): Имя индекса
+    """
+    if _has_index(conn, table, name):
+        conn.execute(text(f"drop index `{name}` on `{table.name}`"))
+
+
+def _has_index(conn: Connection, table: Table, name: str) -> bool:
+    return any(index["name"] == name
+               for index in inspect(conn).get_indexes(table.name))
+
+
+def initial_schema(conn: Connection) -> None:
+    """Таблицы версии 1 из V1_METADATA, а не из текущих models
+    """
+    V1_METADATA.create_all(conn)
+
+
+def report_indexes(conn: Connection) -> None:
+    """Составные индексы отчетов; индекс по дню наблюдения добавляет версия 4
+    """
+    create_index(conn, V1_LEGACY, "ix_symptom_complexes_hash_date",
+                 "symptom_complex_hash", "date")
+    create_index(conn, V1_LEGACY, "ix_symptom_complexes_place_date",
+                 "city", "region", "hospital", "date")
+    create_index(conn, V1_LEGACY, "ix_symptom_complexes_symptom_hash", "symptom_hash")
+    create_index(conn, V1_OBSERVATIONS, "ix_observations_complex_date",
+                 "complex_id", "date")
+    create_index(conn, V1_OBSERVATIONS, "ix_observations_place_date",
+                 "city", "region", "hospital", "date")
+
+
+def observation_day(conn: Connection) -> None:
+    """Хранимая колонка day и индексы по ней вместо индексов по date
+
+    ix_observations_date удаляется у БД, где его создала прежняя версия 2.
+    """
+    columns = {column["name"] for column in inspect(conn).get_columns(OBSERVATIONS.name)}
+    if "day" not in columns:
+        conn.execute(text("alter table observations add column `day` date "
+                          "generated always as (cast(`date` as date)) stored"))
+    create_index(conn, OBSERVATIONS, "ix_observations_complex_day", "complex_id", "day")
+    create_index(conn, OBSERVATIONS, "ix_observations_place_day",
+                 "city", "region", "hospital", "day")
+    create_index(conn, OBSERVATIONS, "ix_observations_day", "day")
+    for name in ("ix_observations_complex_date", "ix_observations_place_date",
+                 "ix_observations_date"):
+        drop_index(conn, OBSERVATIONS, name)
+
+
+def daily_rollups(conn: Connection) -> None:
+    """Таблицы дневных агрегатов, заполненные по существующим наблюдениям
+    """
+    create_tables(conn, DAILY_ROLLUPS, DAILY_ROLLUP_SOURCES)
+    print(f"daily_rollups: {rebuild_rollups(conn)}")
+
+
+def trend_states(conn: Connection) -> None:
+    """Состояние трендов симптомокомлексов, рассчитанное по daily_rollups
+    """
+    create_tables(conn, TREND_STATES)
+    print(f"trend_states: {rebuild_trend_states(conn, trend_window, trend_min_rising)}")
+
+
+def locations(conn: Connection) -> None:
+    """Словарь мест, заполненный по существующим наблюдениям
+    """
+    create_tables(conn, LOCATIONS)
+    places = select(OBSERVATIONS.c.city, OBSERVATIONS.c.region,
+                    OBSERVATIONS.c.hospital).distinct()
+    conn.execute(insert(LOCATIONS).prefix_with("IGNORE").from_select(
+        ["city", "region", "hospital"], places))
+
+
+def rating_snapshots(conn: Connection) -> None:
+    """Снимки рейтинга, строятся disease_trend_system.rating_job или при
+    первом открытии рейтинга на дату
+    """
+    create_tables(conn, RATING_SNAPSHOTS, RATING_SNAPSHOT_DAYS)
+
+
+def rating_snapshot_markers(conn: Connection) -> None:
+    """Строки rating_snapshot_days не удаляются, а помечаются устаревшими
+    (complex_count NULL) и служат блокировкой построения снимка дня
+    """
+    conn.execute(text("alter table rating_snapshot_days modify complex_count int null"))
+
+
+def data_generation(conn: Connection) -> None:
+    """Поколение данных, по которому воркеры узнают о перезаписи наблюдений
+    """
+    create_tables(conn, DATA_GENERATION)
+
+
+def lowercase_hashes(conn: Connection) -> None:
+    """Признаки, сохраненные до приведения к нижнему регистру, получают
+    те же хеши, что и новые данные; агрегаты и тренды пересчитываются
+    """
+    if not lowercase_symptoms(conn):
+        return
+    print(f"daily_rollups: {rebuild_rollups(conn)}")
+    print(f"trend_states: {rebuild_trend_states(conn, trend_window, trend_min_rising)}")
+    conn.execute(update(RATING_SNAPSHOT_DAYS).values(complex_count=None))
+    bump_generation(conn)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """Шаг миграции схемы
+    """
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+MIGRATIONS = (
+    Migration(1, "initial schema", initial_schema),
+    Migration(2, "indexes on symptom_complexes and observations", report_indexes),
+    Migration(3, "move symptom_complexes into normalized tables",
+              normalize_symptom_complexes),
+    Migration(4, "stored observation day with day indexes", observation_day),
+    Migration(5, "daily rollups of observations", daily_rollups),
+    Migration(6, "per-complex trend states", trend_states),
+    Migration(7, "locations dictionary", locations),
+    Migration(8, "daily rating snapshots", rating_snapshots),
+    Migration(9, "rating snapshot markers lock snapshot builds", rating_snapshot_markers),
+    Migration(10, "data generation for in-memory caches", data_generation),
+    Migration(11, "lower-case stored symptoms and re-hash", lowercase_hashes),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version(conn: Connection) -> int:
+    """Текущая версия схемы
+
+    Args:
+        conn (Connection): Соединение
+
+    Returns:
+        int: Последняя примененная версия, 0 для пустой БД
+    """
+    if not inspect(conn).has_table(SCHEMA_VERSION.name):
+        return 0
+    return conn.execute(select(func.max(SCHEMA_VERSION.c.version))).scalar() or 0
+
+
+def upgrade(engine: Engine, target: Optional[int] = None) -> int:
+    """Применить миграции, которых еще нет в schema_version
+
+    Args:
+        engine (Engine): Движок
+        target (Optional[int]): Версия, до которой обновить (по умолчанию последняя)
+
+    Returns:
+        int: Версия схемы после обновления
+    """
+    with engine.begin() as conn:
+        create_tables(conn, SCHEMA_VERSION)
+        version = get_schema_version(conn)
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        if target is not None and migration.version > target:
+            break
+        print(f"applying {migration.version}: {migration.description}")
+        with engine.begin() as conn:
+            migration.upgrade(conn)
+            conn.execute(insert(SCHEMA_VERSION).values(
+                version=migration.version, description=migration.description))
+        version = migration.version
+    return version
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Schema migrations")
+    parser.add_argument("--status", action="store_true",
+                        help="print schema version and pending migrations")
+    parser.add_argument("--target", type=int,
+                        help="upgrade up to this version")
+    parser.add_argument("--renormalize", action="store_true",
+                        help="move symptom_complexes into normalized tables again, "
+                             "overwriting already migrated data")
+    parser.add_argument("--rebuild-rollups", action="store_true",
+                        help="recompute daily_rollups from observations")
+    parser.add_argument("--rebuild-trend-states", action="store_true",
+                        help="recompute trend_states from daily_rollups "
+                             "(after changing TREND_WINDOW or TREND_MIN_RISING)")
+    args = parser.parse_args()
+    db_engine = get_engine()
+    if args.status:
+        with db_engine.connect() as db_conn:
+            current = get_schema_version(db_conn)
+        print(f"schema version: {current}")
+        for pending in MIGRATIONS:
+            if pending.version > current:
+                print(f"pending {pending.version}: {pending.description}")
+    else:
+        print(f"schema version: {upgrade(db_engine, args.target)}")
+        if args.renormalize:
+            with db_engine.begin() as db_conn:
+                normalize_symptom_complexes(db_conn, force=True)
+                # старая таблица хранит признаки в исходном регистре
+                lowercase_symptoms(db_conn)
+                bump_generation(db_conn)
+        if args.renormalize or args.rebuild_rollups:
+            with db_engine.begin() as db_conn:
+                print(f"daily_rollups: {rebuild_rollups(db_conn)}")
+                # снимки рейтинга строились по прежним агрегатам
+                db_conn.execute(update(RATING_SNAPSHOT_DAYS).values(complex_count=None))
+                bump_generation(db_conn)
+        if args.renormalize or args.rebuild_rollups or args.rebuild_trend_states:
+            with db_engine.begin() as db_conn:
+                trend_state_count = rebuild_trend_states(
+                    db_conn, trend_window, trend_min_rising)
+                print(f"trend_states: {trend_state_count}")
@@ -1,18 +1,16 @@
 from datetime import datetime
 
-import sqlalchemy
 from flask_login import UserMixin
-from sqlalchemy import (Column, DateTime, Double, Integer, MetaData, String,
-                        and_, event)
+from sqlalchemy import (BigInteger, Boolean, Column, Computed, Date, DateTime,
+                        Double, ForeignKey, Index, Integer, String, Text,
+                        UniqueConstraint, and_, event)
 from sqlalchemy.orm import Session, declarative_base
 from sqlalchemy_utils import JSONType
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from disease_trend_system.config import (SECRET_KEY, admin_email, admin_name,
-                                         admin_password, admin_username,
-                                         hostname_db, name_db, password_db,
-                                         port, username_db)
-from disease_trend_system.endpoints import SymptomsResource
+                                         admin_password, admin_username)
+from disease_trend_system.database import get_engine
 
 Base = declarative_base()
 
@@ -32,6 +30,190 @@ class SymptomComplexes(Base):
     symptom_hash = Column(String(32), nullable=False)
     symptom_complex_hash = Column(String(32), nullable=False)
 
+    __table_args__ = (
+        Index('ix_symptom_complexes_hash_date', 'symptom_complex_hash', 'date'),
+        Index('ix_symptom_complexes_place_date',
+              'city', 'region', 'hospital', 'date'),
+        Index('ix_symptom_complexes_symptom_hash', 'symptom_hash'),
+    )
+
+
+class Symptom(Base):
+    """Словарь признаков: пара признак-значение хранится один раз
+    """
+    __tablename__ = 'symptoms'
+    id = Column(Integer, primary_key=True)
+    symptom_hash = Column(String(32), nullable=False, unique=True)
+    extra = Column(Text, nullable=False)
+
+
+class Complex(Base):
+    """Симптомокомлекс как набор признаков
+    """
+    __tablename__ = 'complexes'
+    id = Column(Integer, primary_key=True)
+    symptom_complex_hash = Column(String(32), nullable=False, unique=True)
+    symptom_count = Column(Integer, nullable=False, default=0)
+
+
+class ComplexSymptom(Base):
+    """Признаки симптомокомлекса
+    """
+    __tablename__ = 'complex_symptoms'
+    complex_id = Column(Integer, ForeignKey('complexes.id'), primary_key=True)
+    symptom_id = Column(Integer, ForeignKey('symptoms.id'), primary_key=True)
+
+
+class Observation(Base):
+    """Наблюдение симптомокомлекса из одного отчета
+
+    complex_id - симптомокомлекс, под которым наблюдение показывается
+    в трендах (собственный или похожий), source_complex_id - набор
+    признаков, который пришел в отчете. day - день наблюдения, хранимая
+    вычисляемая колонка для индексируемых запросов по диапазону дат.
+    """
+    __tablename__ = 'observations'
+    id = Column(Integer, primary_key=True)
+    complex_id = Column(Integer, ForeignKey('complexes.id'), nullable=False)
+    source_complex_id = Column(Integer, ForeignKey('complexes.id'),
+                               nullable=False)
+    total_number = Column(Integer, nullable=False)
+    date = Column(DateTime, nullable=False)
+    percent_people = Column(Double, nullable=False)
+    city = Column(String(64), nullable=False)
+    region = Column(String(128), nullable=False)
+    hospital = Column(String(128), nullable=False)
+    day = Column(Date, Computed("cast(`date` as date)", persisted=True))
+
+    __table_args__ = (
+        Index('ix_observations_complex_day', 'complex_id', 'day'),
+        Index('ix_observations_place_day',
+              'city', 'region', 'hospital', 'day'),
+        Index('ix_observations_day', 'day'),
+    )
+
+
+class Location(Base):
+    """Словарь мест наблюдений: город, район, мед. учреждение
+    """
+    __tablename__ = 'locations'
+    id = Column(Integer, primary_key=True)
+    city = Column(String(64), nullable=False)
+    region = Column(String(128), nullable=False)
+    hospital = Column(String(128), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('city', 'region', 'hospital',
+                         name='uq_locations_place'),
+    )
+
+
+class DailyRollup(Base):
+    """Дневные суммы наблюдений симптомокомлекса в мед. учреждении
+
+    Суммы взвешены числом признаков исходного симптомокомлекса, как и
+    агрегация в SymptomsDAO.get_trends_data: средние получаются делением
+    на weight.
+    """
+    __tablename__ = 'daily_rollups'
+    day = Column(Date, primary_key=True)
+    complex_id = Column(Integer, ForeignKey('complexes.id'), primary_key=True)
+    city = Column(String(64), primary_key=True)
+    region = Column(String(128), primary_key=True)
+    hospital = Column(String(128), primary_key=True)
+    percent_sum = Column(Double, nullable=False, default=0)
+    total_sum = Column(BigInteger, nullable=False, default=0)
+    weight = Column(Integer, nullable=False, default=0)
+    observation_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('ix_daily_rollups_place_day', 'city', 'region', 'hospital', 'day'),
+    )
+
+
+class DailyRollupSource(Base):
+    """Исходные симптомокомлексы наблюдений из daily_rollups (для extra)
+    """
+    __tablename__ = 'daily_rollup_sources'
+    day = Column(Date, primary_key=True)
+    complex_id = Column(Integer, ForeignKey('complexes.id'), primary_key=True)
+    city = Column(String(64), primary_key=True)
+    region = Column(String(128), primary_key=True)
+    hospital = Column(String(128), primary_key=True)
+    source_complex_id = Column(Integer, ForeignKey('complexes.id'),
+                               primary_key=True)
+
+
+class TrendState(Base):
+    """Текущее состояние тренда симптомокомлекса
+
+    daily_values - JSON {"YYYY-MM-DD": total_number} за последние
+    TREND_WINDOW + 1 дней до last_day, обновляется при записи наблюдений.
+    """
+    __tablename__ = 'trend_states'
+    complex_id = Column(Integer, ForeignKey('complexes.id'), primary_key=True)
+    last_day = Column(Date, nullable=False)
+    daily_values = Column(Text, nullable=False)
+    trending = Column(Boolean, nullable=False, default=False)
+    segment_start = Column(Date)
+
+    __table_args__ = (
+        Index('ix_trend_states_trending_day', 'trending', 'last_day'),
+        Index('ix_trend_states_last_day', 'last_day'),
+    )
+
+
+class RatingSnapshot(Base):
+    """Рейтинг симптомокомлекса за окно RATING_WINDOW дней, заканчивающееся snapshot_day
+
+    Дневные значения - средние по всем местам из daily_rollups, дни
+    максимумов хранятся для инкрементального пересчета следующего дня.
+    """
+    __tablename__ = 'rating_snapshots'
+    snapshot_day = Column(Date, primary_key=True)
+    complex_id = Column(Integer, ForeignKey('complexes.id'), primary_key=True)
+    active_days = Column(Integer, nullable=False)
+    max_percent = Column(Double, nullable=False)
+    max_percent_day = Column(Date, nullable=False)
+    max_total = Column(Double, nullable=False)
+    max_total_day = Column(Date, nullable=False)
+
+    __table_args__ = (
+        Index('ix_rating_snapshots_rank', 'snapshot_day', 'active_days', 'max_percent'),
+    )
+
+
+class RatingSnapshotDay(Base):
+    """Снимки рейтинга по дням; complex_count NULL - снимок не построен или устарел
+
+    Строка дня служит блокировкой, которая упорядочивает построение снимка
+    и пометку его устаревшим при записи наблюдений.
+    """
+    __tablename__ = 'rating_snapshot_days'
+    snapshot_day = Column(Date, primary_key=True)
+    window = Column(Integer, nullable=False)
+    complex_count = Column(Integer)
+    built_on = Column(DateTime, default=datetime.utcnow)
+
+
+class DataGeneration(Base):
+    """Поколение данных: увеличивается, когда migrate перезаписывает
+    наблюдения и агрегаты; воркеры сравнивают его перед записью и
+    сбрасывают структуры в памяти, построенные по прежним данным
+    """
+    __tablename__ = 'data_generation'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    generation = Column(Integer, nullable=False, default=0)
+
+
+class SchemaVersion(Base):
+    """Примененные миграции схемы (disease_trend_system.migrate)
+    """
+    __tablename__ = 'schema_version'
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    description = Column(String(255), nullable=False)
+    applied_on = Column(DateTime, default=datetime.utcnow)
+
 
 class User(Base, UserMixin):
     """Класс пользователя
@@ -81,12 +263,7 @@ def hash_user_password(target, value, oldvalue, initiator):
 def create_admin_user() -> None:
     """Создание первого пользователя
     """
-    engine = sqlalchemy.create_engine(
-        f"mysql+pymysql://{username_db}:{password_db}@{hostname_db}:{port}/{name_db}")
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    metadata.create_all(bind=engine, checkfirst=True)
-    Base.metadata.create_all(engine)
+    engine = get_engine()
     with Session(engine) as session:
         flag = session.query(User).filter(
             and_(User.username == admin_username, User.email == admin_email)).first()
@@ -96,4 +273,3 @@ def create_admin_user() -> None:
                         password=admin_password, email=admin_email, role=1))
             session.commit()
         session.close()
-    engine.dispose()
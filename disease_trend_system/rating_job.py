@@ -0,0 +1,55 @@
+"""Построение снимков рейтинга симптомокомлексов
+
+Запуск: python -m disease_trend_system.rating_job [--day YYYY-MM-DD]
+    [--rebuild-days N] [--every SECONDS]
+
+По умолчанию перестраивает снимки вчерашнего и сегодняшнего дня: каждый
+строится из снимка предыдущего дня, поэтому читаются только новый день и
+день, вышедший из окна RATING_WINDOW. С --every повторяет это с заданным
+интервалом.
+"""
+import argparse
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy.engine import Engine
+
+from disease_trend_system.config import rating_window
+from disease_trend_system.database import get_engine
+from disease_trend_system.services.rating_snapshot import build_snapshot
+
+
+def build_snapshots(engine: Engine, day: date, days: int) -> None:
+    """Перестроить снимки за days дней, заканчивая day
+
+    Args:
+        engine (Engine): Движок
+        day (date): Последний день
+        days (int): Число дней
+    """
+    for offset in range(days - 1, -1, -1):
+        snapshot_day = day - timedelta(days=offset)
+        with engine.begin() as conn:
+            count = build_snapshot(conn, snapshot_day, rating_window, force=True)
+        print(f"rating {snapshot_day}: {count}")
+
+
+def run(engine: Engine, day: Optional[date], days: int, every: Optional[float]) -> None:
+    while True:
+        build_snapshots(engine, day or date.today(), days)
+        if every is None:
+            return
+        time.sleep(every)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Daily rating snapshots")
+    parser.add_argument("--day", type=date.fromisoformat,
+                        help="last snapshot day (default: today)")
+    parser.add_argument("--rebuild-days", type=int, default=2,
+                        help="number of days to rebuild up to --day (default: 2)")
+    parser.add_argument("--every", type=float,
+                        help="repeat every SECONDS")
+    args = parser.parse_args()
+    run(get_engine(), args.day, args.rebuild_days, args.every)
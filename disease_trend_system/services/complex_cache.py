@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+
+from disease_trend_system.models import Complex
+
+COMPLEXES = Complex.__table__
+
+
+class ComplexIdCache:
+    """Известные симптомокомлексы: symptom_complex_hash -> id в памяти
+
+    Прогревается последними max_size строками complexes, пополняется
+    после коммита записи. Вытесняются давно не встречавшиеся хеши, для
+    них и для новых симптомокомлексов id берется из БД. Строки complexes
+    удаляются, а хеши меняются только при слиянии строк, совпавших после
+    приведения признаков к нижнему регистру (migrate, версия 11 и
+    --renormalize). Слияние увеличивает поколение данных (data_generation),
+    и DAO сбрасывает кеш перед следующей записью.
+    """
+
+    def __init__(self, max_size: int = 200000) -> None:
+        self.max_size = max_size
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def warm(self, conn: Connection) -> None:
+        """Загрузить последние max_size симптомокомлексов
+
+        Args:
+            conn (Connection): Соединение
+        """
+        query = select(COMPLEXES.c.symptom_complex_hash, COMPLEXES.c.id).order_by(
+            COMPLEXES.c.id.desc()).limit(self.max_size)
+        rows = conn.execute(query).all()
+        with self._lock:
+            for symptom_complex_hash, complex_id in reversed(rows):
+                self._ids.setdefault(symptom_complex_hash, complex_id)
+            self._evict()
+            self._loaded = True
+
+    def lookup(self, hashes: Iterable[str]) -> Tuple[Dict[str, int], List[str]]:
+        """Разделить хеши на известные и те, что нужно искать в БД
+
+        Args:
+            hashes (Iterable[str]): Хеши симптомокомлексов
+
+        Returns:
+            Tuple[Dict[str, int], List[str]]: Хеш -> id для известных и
+                список остальных хешей
+        """
+        found: Dict[str, int] = {}
+        missing: List[str] = []
+        with self._lock:
+            for symptom_complex_hash in hashes:
+                complex_id = self._ids.get(symptom_complex_hash)
+                if complex_id is None:
+                    missing.append(symptom_complex_hash)
+                else:
+                    self._ids.move_to_end(symptom_complex_hash)
+                    found[symptom_complex_hash] = complex_id
+        return found, missing
+
+    def add(self, ids: Dict[str, int]) -> None:
+        """Запомнить id, прочитанные или записанные закоммиченной транзакцией
+
+        Args:
+            ids (Dict[str, int]): Хеш -> id
+        """
+        with self._lock:
+            self._ids.update(ids)
+            self._evict()
+
+    def clear(self) -> None:
+        """Забыть все id, кеш будет прогрет заново
+        """
+        with self._lock:
+            self._ids = OrderedDict()
+            self._loaded = False
+
+    def _evict(self) -> None:
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
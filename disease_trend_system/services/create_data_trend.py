@@ -1,32 +1,77 @@
-from numpy.typing import ArrayLike
+from typing import Union
+
+import numpy as np
 from pandas import DataFrame
 
+from disease_trend_system.config import (trend_engine, trend_min_rising,
+                                         trend_window,
+                                         trends_parallel_min_rows,
+                                         trends_parallel_workers)
+from disease_trend_system.services.parallel_trends import \
+    ParallelTrendDetector
+from disease_trend_system.services.trend_engine import \
+    SlidingWindowTrendEngine
+
 
 class TrendDetector:
     """Класс фильтрующий тренды
 
+    Симптомокомлекс остается, если у него не меньше threshold дней и
+    total_number по датам хотя бы раз растет (одна точка тоже проходит).
     """
 
-    def _is_desc_sorted(self, arr: ArrayLike) -> bool:
-        if len(arr) == 1:
-            return False
-        for i in range(arr.size-1):
-            if arr[i+1] > arr[i]:
-                return False
-        return True
-
     def __init__(self, trend_threshold: int) -> None:
         self.threshold = trend_threshold
 
     def execute(self, df: DataFrame) -> DataFrame:
-        hashes = df["symptom_complex_hash"].unique()
-        bad_hashes = []
-        for iter_hash in hashes:
-            tmp_df = df[df["symptom_complex_hash"] == iter_hash]
-            tmp_df.sort_values(by=["date"], ascending=True, inplace=True)
-            if len(tmp_df) < self.threshold:
-                bad_hashes.append(iter_hash)
-                continue
-            if self._is_desc_sorted(tmp_df.total_number.to_numpy()):
-                bad_hashes.append(iter_hash)
-        return df[~df["symptom_complex_hash"].isin(bad_hashes)]
+        """Отфильтровать симптомокомлексы без тренда
+
+        Одна сортировка по (хеш, дата), затем размеры групп и признак
+        невозрастания total_number считаются векторно по соседним строкам.
+
+        Args:
+            df (DataFrame): Данные get_trends_data
+
+        Returns:
+            DataFrame: Строки симптомокомлексов с трендом в исходном порядке
+        """
+        if df.empty:
+            return df[:]
+        ordered = df.sort_values(
+            by=["symptom_complex_hash", "date"], kind="mergesort")
+        hashes = ordered["symptom_complex_hash"].to_numpy()
+        totals = ordered["total_number"].to_numpy()
+        same_group = hashes[1:] == hashes[:-1]
+        starts = np.concatenate(([0], np.flatnonzero(~same_group) + 1))
+        groups = np.concatenate(([0], np.cumsum(~same_group)))
+        sizes = np.diff(np.append(starts, len(hashes)))
+        rising = same_group & np.asarray(totals[1:] > totals[:-1], dtype=bool)
+        has_rise = np.bincount(groups[1:], weights=rising,
+                               minlength=len(starts)) > 0
+        good = (sizes >= self.threshold) & ((sizes == 1) | has_rise)
+        return df[df["symptom_complex_hash"].isin(hashes[starts[good]])]
+
+
+def create_trend_detector(trend_threshold: int) -> ParallelTrendDetector:
+    """Фильтр трендов, выбранный переменной TREND_ENGINE
+
+    Большие датафреймы (от TRENDS_PARALLEL_MIN_ROWS строк) обрабатываются
+    в пуле из TRENDS_PARALLEL_WORKERS процессов.
+
+    Args:
+        trend_threshold (int): Порог тренда из интерфейса; для движка window -
+            минимальная продолжительность отрезка тренда в днях
+
+    Returns:
+        ParallelTrendDetector: Объект с методом execute
+    """
+    detector: Union[TrendDetector, SlidingWindowTrendEngine]
+    if trend_engine == "window":
+        detector = SlidingWindowTrendEngine(
+            trend_window, trend_min_rising, min_duration=trend_threshold)
+    elif trend_engine == "threshold":
+        detector = TrendDetector(trend_threshold)
+    else:
+        raise ValueError(f"Unknown trend engine: {trend_engine}")
+    return ParallelTrendDetector(
+        detector, trends_parallel_workers, trends_parallel_min_rows)
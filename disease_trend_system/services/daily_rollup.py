@@ -0,0 +1,104 @@
+from datetime import date
+from typing import Any, Dict, List, Set, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.engine import Connection
+
+from disease_trend_system.models import (Complex, DailyRollup,
+                                         DailyRollupSource, Observation)
+
+COMPLEXES = Complex.__table__
+OBSERVATIONS = Observation.__table__
+DAILY_ROLLUPS = DailyRollup.__table__
+DAILY_ROLLUP_SOURCES = DailyRollupSource.__table__
+
+RollupKey = Tuple[date, int, str, str, str]
+
+
+class RollupDelta:
+    """Приращения дневных агрегатов, накопленные за одну транзакцию записи
+
+    Каждое наблюдение добавляет в строку (day, complex_id, city, region,
+    hospital) взвешенные суммы; flush выполняет один upsert на ключ.
+    """
+
+    def __init__(self) -> None:
+        self.totals: Dict[RollupKey, List[Any]] = {}
+        self.sources: Set[Tuple[RollupKey, int]] = set()
+
+    def add(self, day: date, observation: Dict[str, Any], symptom_count: int) -> None:
+        """Учесть наблюдение
+
+        Args:
+            day (date): День наблюдения
+            observation (Dict[str, Any]): Строка observations
+            symptom_count (int): Число признаков исходного симптомокомлекса
+        """
+        key = (day, observation["complex_id"], observation["city"],
+               observation["region"], observation["hospital"])
+        totals = self.totals.setdefault(key, [0.0, 0, 0, 0])
+        totals[0] += observation["percent_people"] * symptom_count
+        totals[1] += observation["total_number"] * symptom_count
+        totals[2] += symptom_count
+        totals[3] += 1
+        self.sources.add((key, observation["source_complex_id"]))
+
+    def flush(self, conn: Connection) -> None:
+        """Записать приращения в daily_rollups и daily_rollup_sources
+
+        Ключи сортируются, чтобы параллельные транзакции блокировали строки
+        в одном порядке.
+
+        Args:
+            conn (Connection): Соединение с открытой транзакцией
+        """
+        if not self.totals:
+            return
+        stmt = mysql_insert(DAILY_ROLLUPS)
+        stmt = stmt.on_duplicate_key_update(
+            percent_sum=DAILY_ROLLUPS.c.percent_sum + stmt.inserted.percent_sum,
+            total_sum=DAILY_ROLLUPS.c.total_sum + stmt.inserted.total_sum,
+            weight=DAILY_ROLLUPS.c.weight + stmt.inserted.weight,
+            observation_count=DAILY_ROLLUPS.c.observation_count + stmt.inserted.observation_count)
+        conn.execute(stmt, [
+            {"day": key[0], "complex_id": key[1], "city": key[2],
+             "region": key[3], "hospital": key[4], "percent_sum": totals[0],
+             "total_sum": totals[1], "weight": totals[2], "observation_count": totals[3]}
+            for key, totals in sorted(self.totals.items())])
+        conn.execute(insert(DAILY_ROLLUP_SOURCES).prefix_with("IGNORE"), [
+            {"day": key[0], "complex_id": key[1], "city": key[2],
+             "region": key[3], "hospital": key[4], "source_complex_id": source_complex_id}
+            for key, source_complex_id in sorted(self.sources)])
+        self.totals = {}
+        self.sources = set()
+
+
+def rebuild_rollups(conn: Connection) -> int:
+    """Пересчитать дневные агрегаты по всем наблюдениям
+
+    Args:
+        conn (Connection): Соединение с открытой транзакцией
+
+    Returns:
+        int: Число строк daily_rollups
+    """
+    conn.execute(delete(DAILY_ROLLUP_SOURCES))
+    conn.execute(delete(DAILY_ROLLUPS))
+    o = OBSERVATIONS.alias("o")
+    c = COMPLEXES.alias("c")
+    place = (o.c.day, o.c.complex_id, o.c.city, o.c.region, o.c.hospital)
+    totals = select(
+        *place,
+        func.sum(o.c.percent_people * c.c.symptom_count),
+        func.sum(o.c.total_number * c.c.symptom_count),
+        func.sum(c.c.symptom_count),
+        func.count()).select_from(
+        o.join(c, c.c.id == o.c.source_complex_id)).group_by(*place)
+    conn.execute(insert(DAILY_ROLLUPS).from_select(
+        ["day", "complex_id", "city", "region", "hospital",
+         "percent_sum", "total_sum", "weight", "observation_count"], totals))
+    conn.execute(insert(DAILY_ROLLUP_SOURCES).from_select(
+        ["day", "complex_id", "city", "region", "hospital", "source_complex_id"],
+        select(*place, o.c.source_complex_id).distinct()))
+    return conn.execute(select(func.count()).select_from(DAILY_ROLLUPS)).scalar()
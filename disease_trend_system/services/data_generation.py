@@ -0,0 +1,34 @@
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.engine import Connection
+
+from disease_trend_system.models import DataGeneration
+
+DATA_GENERATION = DataGeneration.__table__
+
+# в таблице одна строка
+GENERATION_ID = 1
+
+
+def read_generation(conn: Connection) -> int:
+    """Текущее поколение данных
+
+    Args:
+        conn (Connection): Соединение
+
+    Returns:
+        int: Поколение, 0 - данные еще не перезаписывались
+    """
+    return conn.execute(select(DATA_GENERATION.c.generation).where(
+        DATA_GENERATION.c.id == GENERATION_ID)).scalar() or 0
+
+
+def bump_generation(conn: Connection) -> None:
+    """Увеличить поколение данных после перезаписи наблюдений или агрегатов
+
+    Args:
+        conn (Connection): Соединение с открытой транзакцией
+    """
+    stmt = mysql_insert(DATA_GENERATION).values(id=GENERATION_ID, generation=1)
+    conn.execute(stmt.on_duplicate_key_update(
+        generation=DATA_GENERATION.c.generation + 1))
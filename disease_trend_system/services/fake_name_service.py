@@ -1,3 +1,4 @@
+from sqlalchemy import ColumnElement, func
 
 
 def generate_fake_symptom_complex_name(name: str) -> str:
@@ -10,3 +11,15 @@ def generate_fake_symptom_complex_name(name: str) -> str:
         str: Симптомокомлекс + 3 первых символа
     """
     return "СК"+name[:3]
+
+
+def fake_symptom_complex_name_sql(column: ColumnElement) -> ColumnElement:
+    """То же короткое именование выражением SQL (для фильтров и сортировки в запросе)
+
+    Args:
+        column (ColumnElement): Колонка с хешем
+
+    Returns:
+        ColumnElement: Выражение "СК" + 3 первых символа
+    """
+    return func.concat("СК", func.left(column, 3))
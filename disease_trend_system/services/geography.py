@@ -0,0 +1,103 @@
+import bisect
+import threading
+import time
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+
+from disease_trend_system.models import Location
+
+LOCATIONS = Location.__table__
+
+Place = Tuple[str, str, str]
+
+
+class GeographyTree:
+    """Дерево город -> район -> мед. учреждение в памяти
+
+    Загружается из словаря locations и перечитывает его целиком не чаще
+    раза в refresh_interval секунд (места, добавленные другими воркерами).
+    Словарь небольшой, а дочитывание по id пропускало бы строки с меньшим
+    id, закоммиченные позже строк с большим. Места из собственных записей
+    добавляются сразу после коммита. Списки хранятся отсортированными,
+    выдача - без обращения к БД.
+    """
+
+    def __init__(self, refresh_interval: float = 30.0) -> None:
+        self.refresh_interval = refresh_interval
+        self._cities: List[str] = []
+        self._regions: Dict[str, List[str]] = {}
+        self._hospitals: Dict[Tuple[str, str], List[str]] = {}
+        self._places: Set[Place] = set()
+        self._loaded = False
+        self._refreshed = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def needs_refresh(self) -> bool:
+        return not self.loaded or time.monotonic() - self._refreshed > self.refresh_interval
+
+    def refresh(self, conn: Connection) -> None:
+        """Загрузить дерево или добавить новые места из словаря
+
+        Args:
+            conn (Connection): Соединение
+        """
+        rows = conn.execute(select(LOCATIONS.c.city, LOCATIONS.c.region,
+                                   LOCATIONS.c.hospital)).all()
+        with self._lock:
+            for city, region, hospital in rows:
+                self._add((city, region, hospital))
+            self._loaded = True
+            self._refreshed = time.monotonic()
+
+    def add(self, places: Iterable[Place]) -> None:
+        """Добавить места, записанные этим процессом
+
+        Args:
+            places (Iterable[Place]): Тройки (город, район, мед. учреждение)
+        """
+        with self._lock:
+            for place in places:
+                self._add(place)
+
+    def _add(self, place: Place) -> None:
+        if place in self._places:
+            return
+        self._places.add(place)
+        city, region, hospital = place
+        if city not in self._regions:
+            bisect.insort(self._cities, city)
+            self._regions[city] = []
+        if (city, region) not in self._hospitals:
+            bisect.insort(self._regions[city], region)
+            self._hospitals[(city, region)] = []
+        bisect.insort(self._hospitals[(city, region)], hospital)
+
+    def missing(self, places: Iterable[Place]) -> List[Place]:
+        """Места, которых еще нет в дереве
+
+        Args:
+            places (Iterable[Place]): Тройки (город, район, мед. учреждение)
+
+        Returns:
+            List[Place]: Новые места
+        """
+        with self._lock:
+            return [place for place in places if place not in self._places]
+
+    def cities(self) -> List[str]:
+        with self._lock:
+            return list(self._cities)
+
+    def regions(self, city: str) -> List[str]:
+        with self._lock:
+            return list(self._regions.get(city, ()))
+
+    def hospitals(self, city: str, region: str) -> List[str]:
+        with self._lock:
+            return list(self._hospitals.get((city, region), ()))
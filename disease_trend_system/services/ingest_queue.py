@@ -0,0 +1,136 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+from disease_trend_system.config import (ingest_group_age, ingest_group_size,
+                                         ingest_queue_size)
+from disease_trend_system.services.symptom_complexes_dao import (
+    SymptomDTO, get_symptoms_dao)
+
+logger = logging.getLogger(__name__)
+
+SAVE_ATTEMPTS = 3
+
+
+class IngestQueue:
+    """Ограниченная очередь отложенной записи симптомокомлексов
+
+    Эндпоинты кладут симптомокомлексы в очередь и сразу отвечают,
+    фоновый поток-писатель забирает их группами (по размеру или по
+    возрасту) и сохраняет каждую группу одной транзакцией.
+    """
+
+    def __init__(self, save: Callable[[List[List[SymptomDTO]]], None],
+                 max_size: int, group_size: int, group_age: float) -> None:
+        self._save = save
+        self._max_size = max_size
+        self._group_size = group_size
+        self._group_age = group_age
+        self._items: Deque[List[SymptomDTO]] = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._writer: Optional[threading.Thread] = None
+
+    def put(self, symptom_complexes: List[List[SymptomDTO]]) -> bool:
+        """Поставить симптомокомлексы в очередь целиком
+
+        Args:
+            symptom_complexes (List[List[SymptomDTO]]): Симптомокомлексы
+
+        Returns:
+            bool: False, если в очереди нет места (элементы не добавлены)
+        """
+        with self._cond:
+            if len(self._items) + len(symptom_complexes) > self._max_size:
+                return False
+            self._ensure_writer()
+            self._items.extend(symptom_complexes)
+            self._cond.notify()
+        return True
+
+    def _ensure_writer(self) -> None:
+        """Запуск потока-писателя (лениво, чтобы поток жил в воркере,
+        а не в мастер-процессе gunicorn)
+        """
+        if self._writer is None or not self._writer.is_alive():
+            self._stopping = False
+            self._writer = threading.Thread(
+                target=self._run, name="symptoms-ingest-writer", daemon=True)
+            self._writer.start()
+
+    def _take_group(self) -> List[List[SymptomDTO]]:
+        """Дождаться и забрать очередную группу
+
+        Returns:
+            List[List[SymptomDTO]]: Группа, пустая только при остановке
+        """
+        with self._cond:
+            while not self._items and not self._stopping:
+                self._cond.wait()
+            deadline = time.monotonic() + self._group_age
+            while len(self._items) < self._group_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            size = min(self._group_size, len(self._items))
+            return [self._items.popleft() for _ in range(size)]
+
+    def _commit(self, group: List[List[SymptomDTO]]) -> None:
+        """Сохранение группы с повторами при ошибках БД
+
+        Args:
+            group (List[List[SymptomDTO]]): Группа симптомокомлексов
+        """
+        for attempt in range(1, SAVE_ATTEMPTS + 1):
+            try:
+                self._save(group)
+                return
+            except Exception as _:
+                logger.exception("Failed to save %d symptom complexes (attempt %d/%d)",
+                                 len(group), attempt, SAVE_ATTEMPTS)
+                time.sleep(attempt)
+        logger.error("Dropped %d symptom complexes", len(group))
+
+    def _run(self) -> None:
+        while True:
+            group = self._take_group()
+            if not group:
+                return
+            self._commit(group)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Остановить писателя, дописав все, что осталось в очереди
+
+        Args:
+            timeout (Optional[float]): Время ожидания потока
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._writer is not None:
+            self._writer.join(timeout)
+
+
+_ingest_queue: Optional[IngestQueue] = None
+_ingest_queue_lock = threading.Lock()
+
+
+def get_ingest_queue() -> IngestQueue:
+    """Получить общую для процесса очередь отложенной записи
+
+    Returns:
+        IngestQueue: Очередь
+    """
+    global _ingest_queue
+    if _ingest_queue is None:
+        with _ingest_queue_lock:
+            if _ingest_queue is None:
+                _ingest_queue = IngestQueue(
+                    lambda group: get_symptoms_dao().save_symptom_complexes(group),
+                    ingest_queue_size, ingest_group_size, ingest_group_age)
+                atexit.register(_ingest_queue.stop)
+    return _ingest_queue
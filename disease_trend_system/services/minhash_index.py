@@ -0,0 +1,114 @@
+import random
+from typing import Dict, List, Set, Tuple
+
+from disease_trend_system.services.similarity_engine import SimilarityEngine
+
+MASK_64 = (1 << 64) - 1
+MINHASH_SEED = 20230330
+
+Signature = Tuple[int, ...]
+
+
+class MinHashIndex(SimilarityEngine):
+    """Поиск похожих симптомокомлексов через MinHash и LSH
+
+    Симптомокомлекс - множество MD5-хешей признаков
+    (SymtomComplexTransform._dict_hash), для которого строится
+    MinHash-сигнатура из num_perm хеш-функций вида (a * x + b) mod 2^64.
+    Сигнатура режется на bands полос, симптомокомлексы с совпавшей полосой
+    попадают в одну корзину. Кандидаты берутся только из корзин нового
+    симптомокомлекса и проверяются точно: коэффициент Жаккара не меньше
+    threshold и число отличающихся признаков не больше radius.
+    """
+
+    def __init__(self, threshold: float = 0.5, radius: int = 1,
+                 num_perm: int = 32, bands: int = 16,
+                 lookback: int = 1000) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        super().__init__(lookback)
+        self.threshold = threshold
+        self.radius = radius
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        rnd = random.Random(MINHASH_SEED)
+        self._permutations = [(rnd.getrandbits(64) | 1, rnd.getrandbits(64))
+                              for _ in range(num_perm)]
+        self._symptom_minhashes: Dict[str, Signature] = {}
+        self._clear()
+
+    def _clear(self) -> None:
+        self._complexes: Dict[str, Set[str]] = {}
+        self._signatures: Dict[str, Signature] = {}
+        self._buckets: Dict[Tuple[int, Signature], Set[str]] = {}
+        self._dirty: Set[str] = set()
+
+    def _symptom_minhash(self, symptom_hash: str) -> Signature:
+        """Значения всех хеш-функций для одного признака (кешируются)
+
+        Args:
+            symptom_hash (str): MD5-хеш признака
+
+        Returns:
+            Signature: Значения хеш-функций
+        """
+        minhash = self._symptom_minhashes.get(symptom_hash)
+        if minhash is None:
+            x = int(symptom_hash[:16], 16)
+            minhash = tuple(((a * x + b) & MASK_64) >> 32
+                            for a, b in self._permutations)
+            self._symptom_minhashes[symptom_hash] = minhash
+        return minhash
+
+    def _signature(self, symptom_hashes: Set[str]) -> Signature:
+        return tuple(map(min, *(self._symptom_minhash(symptom_hash)
+                                for symptom_hash in symptom_hashes)))
+
+    def _band_keys(self, signature: Signature) -> List[Tuple[int, Signature]]:
+        return list(enumerate(zip(*[iter(signature)] * self.rows_per_band)))
+
+    def _add(self, symptom_hash: str, symptom_complex_hash: str) -> None:
+        symptoms = self._complexes.setdefault(symptom_complex_hash, set())
+        if symptom_hash not in symptoms:
+            symptoms.add(symptom_hash)
+            self._dirty.add(symptom_complex_hash)
+
+    def _flush(self) -> None:
+        for symptom_complex_hash in self._dirty:
+            old_signature = self._signatures.get(symptom_complex_hash)
+            if old_signature is not None:
+                for key in self._band_keys(old_signature):
+                    bucket = self._buckets[key]
+                    bucket.discard(symptom_complex_hash)
+                    if not bucket:
+                        del self._buckets[key]
+            signature = self._signature(self._complexes[symptom_complex_hash])
+            self._signatures[symptom_complex_hash] = signature
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, set()).add(symptom_complex_hash)
+        self._dirty = set()
+
+    def find_similar(self, symptom_hashes: List[str]) -> List[str]:
+        """Хеши симптомокомлексов, похожих на новый по Жаккару и числу отличий
+
+        Args:
+            symptom_hashes (List[str]): Хеши признаков нового симптомокомлекса
+
+        Returns:
+            List[str]: Хеши похожих симптомокомлексов
+        """
+        query = set(symptom_hashes)
+        if not query:
+            return []
+        result = []
+        with self._lock:
+            candidates: Set[str] = set()
+            for key in self._band_keys(self._signature(query)):
+                candidates.update(self._buckets.get(key, ()))
+            for symptom_complex_hash in candidates:
+                symptoms = self._complexes[symptom_complex_hash]
+                common = len(query & symptoms)
+                union = len(query) + len(symptoms) - common
+                if common / union >= self.threshold and union - common <= self.radius:
+                    result.append(symptom_complex_hash)
+        return result
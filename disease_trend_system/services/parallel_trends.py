@@ -0,0 +1,122 @@
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.typing import NDArray
+from pandas import DataFrame
+
+from disease_trend_system.services.trend_engine import \
+    SlidingWindowTrendEngine
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_trend_executor(workers: int) -> ProcessPoolExecutor:
+    """Общий для процесса пул процессов расчета трендов
+
+    Процессы запускаются через forkserver: форк многопоточного воркера
+    gunicorn небезопасен, а spawn каждый раз импортирует pandas заново.
+
+    Args:
+        workers (int): Число процессов
+
+    Returns:
+        ProcessPoolExecutor: Пул процессов
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    workers, mp_context=multiprocessing.get_context("forkserver"))
+                atexit.register(_executor.shutdown, cancel_futures=True)
+    return _executor
+
+
+def reset_trend_executor(executor: ProcessPoolExecutor) -> None:
+    """Забыть сломанный пул, следующий запрос создаст новый
+
+    Пул ломается целиком (BrokenProcessPool), если один из процессов
+    завершился аварийно, например по OOM или сигналу.
+
+    Args:
+        executor (ProcessPoolExecutor): Пул, вернувший ошибку
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+            atexit.unregister(executor.shutdown)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _execute_shard(detector: Any, shard: DataFrame) -> NDArray:
+    """Расчет трендов части симптомокомлексов в процессе пула
+
+    Args:
+        detector (Any): Фильтр трендов с методом execute
+        shard (DataFrame): Строки части симптомокомлексов, индекс - позиции
+            строк в исходном датафрейме
+
+    Returns:
+        NDArray: Позиции оставшихся строк
+    """
+    return detector.execute(shard).index.to_numpy()
+
+
+class ParallelTrendDetector:
+    """Параллельный расчет трендов по частям симптомокомлексов
+
+    Тренды каждого симптомокомлекса считаются независимо, поэтому датафрейм
+    делится на shards частей по symptom_complex_hash и обрабатывается
+    в пуле процессов. В процессы передаются только нужные колонки, обратно
+    возвращаются позиции оставшихся строк; результат собирается в исходном
+    порядке строк и совпадает с последовательным расчетом. Датафреймы
+    меньше min_rows, а также запросы, во время которых пул сломался,
+    считаются в текущем потоке.
+    """
+
+    def __init__(self, detector: Any, workers: int, min_rows: int) -> None:
+        self.detector = detector
+        self.workers = workers
+        self.min_rows = min_rows
+
+    def execute(self, df: DataFrame) -> DataFrame:
+        """Отфильтровать симптомокомлексы без тренда
+
+        Args:
+            df (DataFrame): Данные get_trends_data
+
+        Returns:
+            DataFrame: Строки симптомокомлексов с трендом в исходном порядке
+        """
+        if self.workers < 2 or len(df) < self.min_rows:
+            return self.detector.execute(df)
+        detector = self.detector
+        if isinstance(detector, SlidingWindowTrendEngine):
+            detector = detector.with_day_range(df["date"].min(), df["date"].max())
+        metric = getattr(detector, "metric", "total_number")
+        slim = DataFrame({
+            "symptom_complex_hash": df["symptom_complex_hash"].to_numpy(),
+            "date": df["date"].to_numpy(),
+            metric: df[metric].to_numpy(dtype=float),
+        }, index=pd.RangeIndex(len(df)))
+        codes, _ = pd.factorize(slim["symptom_complex_hash"])
+        shards = codes % self.workers
+        executor = get_trend_executor(self.workers)
+        try:
+            futures = [executor.submit(_execute_shard, detector, slim[shards == shard])
+                       for shard in range(self.workers)]
+            positions = np.sort(np.concatenate([future.result() for future in futures]))
+        except BrokenProcessPool as _:
+            # процесс пула завершился аварийно: пул пересоздается при
+            # следующем запросе, этот считается в текущем потоке
+            reset_trend_executor(executor)
+            return self.detector.execute(df)
+        return df.iloc[positions]
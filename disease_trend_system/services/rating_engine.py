@@ -0,0 +1,120 @@
+from datetime import date
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+# метрики силы тренда, по которым можно ранжировать рейтинг
+RATING_METRICS = ("slope_percent", "slope_total", "growth", "coverage")
+
+SCORE_COLUMNS = ["complex_id", "active_days", "max_percent", "max_total",
+                 *RATING_METRICS]
+
+
+def _slope(n: np.ndarray, sx: np.ndarray, sxx: np.ndarray, sy: np.ndarray,
+           sxy: np.ndarray) -> np.ndarray:
+    denominator = n * sxx - sx * sx
+    numerator = n * sxy - sx * sy
+    # у симптомокомлекса с одним днем наблюдений наклон нулевой
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator),
+                     where=denominator != 0)
+
+
+def trend_strength(values: DataFrame, start_day: date, end_day: date) -> DataFrame:
+    """Сила тренда каждого симптомокомлекса за период одним векторным проходом
+
+    Наклоны - МНК по дням периода, growth - отношение числа людей в
+    последний и первый день наблюдений (сглаженное +1), coverage - доля
+    дней периода с наблюдениями.
+
+    Args:
+        values (DataFrame): complex_id, day, percent_people, total_number -
+            дневные значения симптомокомлексов
+        start_day (date): Первый день периода
+        end_day (date): Последний день периода
+
+    Returns:
+        DataFrame: Колонки SCORE_COLUMNS, строка на симптомокомлекс
+    """
+    if values.empty:
+        return DataFrame(columns=SCORE_COLUMNS)
+    codes, complex_ids = pd.factorize(values["complex_id"], sort=True)
+    x = (pd.to_datetime(values["day"]) - pd.Timestamp(start_day)).dt.days.to_numpy(np.float64)
+    percent = values["percent_people"].to_numpy(np.float64)
+    total = values["total_number"].to_numpy(np.float64)
+    groups = len(complex_ids)
+
+    n = np.bincount(codes, minlength=groups).astype(np.float64)
+    sx = np.bincount(codes, x, groups)
+    sxx = np.bincount(codes, x * x, groups)
+
+    order = np.lexsort((x, codes))
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    sorted_total = total[order]
+    first_total = sorted_total[starts]
+    last_total = sorted_total[ends]
+
+    return DataFrame({
+        "complex_id": np.asarray(complex_ids),
+        "active_days": n.astype(np.int64),
+        "max_percent": np.maximum.reduceat(percent[order], starts),
+        "max_total": np.maximum.reduceat(sorted_total, starts),
+        "slope_percent": _slope(n, sx, sxx, np.bincount(codes, percent, groups),
+                                np.bincount(codes, x * percent, groups)),
+        "slope_total": _slope(n, sx, sxx, np.bincount(codes, total, groups),
+                              np.bincount(codes, x * total, groups)),
+        "growth": (last_total + 1) / (first_total + 1),
+        "coverage": n / ((end_day - start_day).days + 1),
+    })
+
+
+def top_k(scores: DataFrame, metric: str, k: int) -> DataFrame:
+    """Первые k симптомокомлексов по метрике без полной сортировки
+
+    Частичный отбор argpartition, отсортированы только отобранные строки.
+    Равные значения упорядочены по complex_id, поэтому страницы с разным k
+    согласованы.
+
+    Args:
+        scores (DataFrame): Результат trend_strength
+        metric (str): Метрика из RATING_METRICS
+        k (int): Сколько строк вернуть
+
+    Returns:
+        DataFrame: Строки по убыванию метрики
+    """
+    if metric not in RATING_METRICS:
+        raise ValueError(f"Unknown rating metric: {metric}")
+    if scores.empty or k <= 0:
+        return scores.iloc[0:0]
+    values = np.nan_to_num(scores[metric].to_numpy(np.float64), nan=-np.inf)
+    complex_ids = scores["complex_id"].to_numpy()
+    if k < len(values):
+        threshold = values[np.argpartition(-values, k - 1)[:k]].min()
+        candidates = np.flatnonzero(values >= threshold)
+    else:
+        candidates = np.arange(len(values))
+    order = np.lexsort((complex_ids[candidates], -values[candidates]))
+    return scores.iloc[candidates[order][:k]]
+
+
+def rating_page(scores: DataFrame, metric: str, page_current: int,
+                page_size: int) -> Tuple[DataFrame, int]:
+    """Страница рейтинга по метрике
+
+    Args:
+        scores (DataFrame): Результат trend_strength
+        metric (str): Метрика из RATING_METRICS
+        page_current (int): Номер страницы
+        page_size (int): Размер страницы
+
+    Returns:
+        Tuple[DataFrame, int]: Строки страницы и число страниц
+    """
+    page_count = max(1, -(-len(scores) // page_size))
+    page_current = min(max(page_current or 0, 0), page_count - 1)
+    start = page_current * page_size
+    return top_k(scores, metric, start + page_size).iloc[start:], page_count
@@ -0,0 +1,305 @@
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pandas import DataFrame
+from sqlalchemy import ColumnElement, delete, func, insert, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.engine import Connection
+
+from disease_trend_system.models import (Complex, ComplexSymptom, DailyRollup,
+                                         RatingSnapshot, RatingSnapshotDay,
+                                         Symptom)
+from disease_trend_system.services.fake_name_service import \
+    fake_symptom_complex_name_sql
+from disease_trend_system.services.table_query import sql_table_query
+
+COMPLEXES = Complex.__table__
+COMPLEX_SYMPTOMS = ComplexSymptom.__table__
+SYMPTOMS = Symptom.__table__
+DAILY_ROLLUPS = DailyRollup.__table__
+RATING_SNAPSHOTS = RatingSnapshot.__table__
+RATING_SNAPSHOT_DAYS = RatingSnapshotDay.__table__
+
+ONE_DAY = timedelta(days=1)
+
+RATING_COLUMNS = ["symptom_complex_hash", "date", "percent_people",
+                  "total_number", "extra"]
+
+DailyValue = Tuple[int, date, float, float]
+
+
+def window_start(day: date, window: int) -> date:
+    """Первый день окна рейтинга: окно с day - window по day включительно
+    """
+    return day - window * ONE_DAY
+
+
+def daily_values(conn: Connection, start_day: date, end_day: date,
+                 complex_ids: Optional[List[int]] = None) -> List[DailyValue]:
+    """Дневные значения симптомокомлексов по всем местам из daily_rollups
+
+    Args:
+        conn (Connection): Соединение
+        start_day (date): Первый день
+        end_day (date): Последний день
+        complex_ids (Optional[List[int]]): Только эти симптомокомлексы
+
+    Returns:
+        List[DailyValue]: (complex_id, день, процент людей, число людей)
+    """
+    query = select(
+        DAILY_ROLLUPS.c.complex_id, DAILY_ROLLUPS.c.day,
+        func.sum(DAILY_ROLLUPS.c.percent_sum) / func.sum(DAILY_ROLLUPS.c.weight),
+        func.sum(DAILY_ROLLUPS.c.total_sum) / func.sum(DAILY_ROLLUPS.c.weight)).where(
+        DAILY_ROLLUPS.c.day >= start_day, DAILY_ROLLUPS.c.day <= end_day).group_by(
+        DAILY_ROLLUPS.c.complex_id, DAILY_ROLLUPS.c.day)
+    if complex_ids is not None:
+        query = query.where(DAILY_ROLLUPS.c.complex_id.in_(complex_ids))
+    return [(complex_id, day, float(percent), float(total))
+            for complex_id, day, percent, total in conn.execute(query)]
+
+
+def _add_day(rating: Dict[int, Dict[str, Any]], value: DailyValue) -> None:
+    complex_id, day, percent, total = value
+    row = rating.get(complex_id)
+    if row is None:
+        rating[complex_id] = {"complex_id": complex_id, "active_days": 1,
+                              "max_percent": percent, "max_percent_day": day,
+                              "max_total": total, "max_total_day": day}
+        return
+    row["active_days"] += 1
+    # при равенстве берется более поздний день: максимум дольше остается в окне
+    if percent > row["max_percent"] or (percent == row["max_percent"]
+                                        and day > row["max_percent_day"]):
+        row["max_percent"], row["max_percent_day"] = percent, day
+    if total > row["max_total"] or (total == row["max_total"]
+                                    and day > row["max_total_day"]):
+        row["max_total"], row["max_total_day"] = total, day
+
+
+def _fold(values: Iterable[DailyValue]) -> Dict[int, Dict[str, Any]]:
+    rating: Dict[int, Dict[str, Any]] = {}
+    for value in values:
+        _add_day(rating, value)
+    return rating
+
+
+def _snapshot_window(conn: Connection, day: date) -> Optional[int]:
+    return conn.execute(select(RATING_SNAPSHOT_DAYS.c.window).where(
+        RATING_SNAPSHOT_DAYS.c.snapshot_day == day,
+        RATING_SNAPSHOT_DAYS.c.complex_count.is_not(None))).scalar()
+
+
+def snapshot_ready(conn: Connection, day: date, window: int) -> bool:
+    """Снимок дня построен с этим окном и не устарел
+
+    Обычное чтение без блокировки: читатели рейтинга не ждут друг друга и
+    записи наблюдений, пока снимок актуален.
+
+    Args:
+        conn (Connection): Соединение
+        day (date): Последний день окна
+        window (int): Длина окна в днях
+
+    Returns:
+        bool: Снимок можно читать без построения
+    """
+    return _snapshot_window(conn, day) == window
+
+
+def _lock_marker(conn: Connection, day: date, window: int) -> Tuple[int, Optional[int]]:
+    """Заблокировать строку rating_snapshot_days дня, при необходимости создав ее
+
+    Пустой upsert сразу берет исключительную блокировку строки (insert
+    ignore с последующим select for update взаимоблокировался бы у двух
+    построителей одного дня). Пока она держится, invalidate_snapshots
+    ждет коммита построения, а построение, начатое после записи, ждет ее
+    коммита и читает уже записанные агрегаты.
+
+    Returns:
+        Tuple[int, Optional[int]]: Окно и число симптомокомлексов
+            построенного снимка (None - снимок не построен или устарел)
+    """
+    stmt = mysql_insert(RATING_SNAPSHOT_DAYS).values(
+        snapshot_day=day, window=window, complex_count=None)
+    conn.execute(stmt.on_duplicate_key_update(snapshot_day=stmt.inserted.snapshot_day))
+    row = conn.execute(select(RATING_SNAPSHOT_DAYS.c.window,
+                              RATING_SNAPSHOT_DAYS.c.complex_count).where(
+        RATING_SNAPSHOT_DAYS.c.snapshot_day == day).with_for_update()).one()
+    return row.window, row.complex_count
+
+
+def _load(conn: Connection, day: date) -> Dict[int, Dict[str, Any]]:
+    query = select(RATING_SNAPSHOTS).where(RATING_SNAPSHOTS.c.snapshot_day == day)
+    rating = {}
+    for row in conn.execute(query):
+        row = row._asdict()
+        del row["snapshot_day"]
+        rating[row["complex_id"]] = row
+    return rating
+
+
+def _advance(conn: Connection, previous: Dict[int, Dict[str, Any]], day: date,
+             window: int) -> Dict[int, Dict[str, Any]]:
+    """Рейтинг дня из рейтинга предыдущего дня
+
+    Добавляется новый день и вычитается день, вышедший из окна. Максимумы
+    пересчитываются по окну только у симптомокомлексов, чей максимум
+    пришелся на вышедший день.
+    """
+    expired = window_start(day, window) - ONE_DAY
+    rating = previous
+    stale = set()
+    for complex_id, _, _, _ in daily_values(conn, expired, expired):
+        row = rating.get(complex_id)
+        if row is None:
+            continue
+        row["active_days"] -= 1
+        if row["active_days"] <= 0:
+            del rating[complex_id]
+        elif expired in (row["max_percent_day"], row["max_total_day"]):
+            stale.add(complex_id)
+    for value in daily_values(conn, day, day):
+        _add_day(rating, value)
+    if stale:
+        rating.update(_fold(daily_values(
+            conn, window_start(day, window), day, sorted(stale))))
+    return rating
+
+
+def build_snapshot(conn: Connection, day: date, window: int,
+                   force: bool = False) -> int:
+    """Построить снимок рейтинга на день
+
+    Снимок строится из снимка предыдущего дня, если он есть и построен
+    с тем же окном, иначе по всем дням окна. Строка дня в
+    rating_snapshot_days блокируется до чтения агрегатов, поэтому
+    вызываться должно первым запросом транзакции.
+
+    Args:
+        conn (Connection): Соединение с открытой транзакцией
+        day (date): Последний день окна
+        window (int): Длина окна в днях
+        force (bool): Перестроить существующий снимок
+
+    Returns:
+        int: Число симптомокомлексов в снимке
+    """
+    built_window, count = _lock_marker(conn, day, window)
+    if not force and count is not None and built_window == window:
+        return count
+    if _snapshot_window(conn, day - ONE_DAY) == window:
+        rating = _advance(conn, _load(conn, day - ONE_DAY), day, window)
+    else:
+        rating = _fold(daily_values(conn, window_start(day, window), day))
+    conn.execute(delete(RATING_SNAPSHOTS).where(RATING_SNAPSHOTS.c.snapshot_day == day))
+    if rating:
+        conn.execute(insert(RATING_SNAPSHOTS),
+                     [dict(row, snapshot_day=day)
+                      for _, row in sorted(rating.items())])
+    conn.execute(update(RATING_SNAPSHOT_DAYS).where(
+        RATING_SNAPSHOT_DAYS.c.snapshot_day == day).values(
+        window=window, complex_count=len(rating), built_on=func.utc_timestamp()))
+    return len(rating)
+
+
+def invalidate_snapshots(conn: Connection, start_day: date, end_day: date,
+                         window: int) -> None:
+    """Пометить устаревшими снимки, в окна которых попадают записанные дни
+
+    Строки дней остаются и блокируются вместе с промежутками между ними:
+    построение снимка этих дней, начатое раньше, дописывается до пометки,
+    начатое позже - ждет коммита записи.
+
+    Args:
+        conn (Connection): Соединение с открытой транзакцией
+        start_day (date): Первый записанный день
+        end_day (date): Последний записанный день
+        window (int): Длина окна в днях
+    """
+    conn.execute(update(RATING_SNAPSHOT_DAYS).where(
+        RATING_SNAPSHOT_DAYS.c.snapshot_day >= start_day,
+        RATING_SNAPSHOT_DAYS.c.snapshot_day <= end_day + window * ONE_DAY).values(
+        complex_count=None))
+
+
+def _complex_description(complex_id: ColumnElement) -> ColumnElement:
+    return select(func.group_concat(SYMPTOMS.c.extra)).select_from(
+        COMPLEX_SYMPTOMS.join(SYMPTOMS, SYMPTOMS.c.id == COMPLEX_SYMPTOMS.c.symptom_id)).where(
+        COMPLEX_SYMPTOMS.c.complex_id == complex_id).scalar_subquery()
+
+
+# колонки таблицы рейтинга как выражения по снимку, значения - как в таблице
+RATING_TABLE_COLUMNS = {
+    "symptom_complex_hash": fake_symptom_complex_name_sql(COMPLEXES.c.symptom_complex_hash),
+    "date": RATING_SNAPSHOTS.c.active_days,
+    "percent_people": RATING_SNAPSHOTS.c.max_percent / 100,
+    "total_number": RATING_SNAPSHOTS.c.max_total,
+    "extra": _complex_description(RATING_SNAPSHOTS.c.complex_id),
+}
+
+
+def read_rating_page(conn: Connection, day: date, page_current: int, page_size: int,
+                     filter_query: Optional[str] = None,
+                     sort_by: Optional[List[Dict[str, str]]] = None) -> Tuple[DataFrame, int]:
+    """Страница рейтинга из снимка: по числу дней с наблюдениями, затем по
+    максимальному проценту людей
+
+    Фильтр и сортировка таблицы выполняются в запросе к снимку, сортировка
+    таблицы идет перед порядком рейтинга.
+
+    Args:
+        conn (Connection): Соединение
+        day (date): День снимка
+        page_current (int): Номер страницы
+        page_size (int): Размер страницы
+        filter_query (Optional[str]): filter_query таблицы
+        sort_by (Optional[List[Dict[str, str]]]): sort_by таблицы
+
+    Returns:
+        Tuple[DataFrame, int]: symptom_complex_hash, date (число дней),
+            percent_people, total_number, extra и число страниц
+    """
+    rs = RATING_SNAPSHOTS
+    conditions, order_by = sql_table_query(RATING_TABLE_COLUMNS, filter_query, sort_by)
+    source = rs.join(COMPLEXES, COMPLEXES.c.id == rs.c.complex_id)
+    if conditions:
+        count = conn.execute(select(func.count()).select_from(source).where(
+            rs.c.snapshot_day == day, *conditions)).scalar()
+    else:
+        count = conn.execute(select(RATING_SNAPSHOT_DAYS.c.complex_count).where(
+            RATING_SNAPSHOT_DAYS.c.snapshot_day == day)).scalar() or 0
+    page_count = max(1, -(-count // page_size))
+    page_current = min(max(page_current or 0, 0), page_count - 1)
+    page = conn.execute(select(
+        rs.c.complex_id, COMPLEXES.c.symptom_complex_hash, rs.c.active_days,
+        rs.c.max_percent, rs.c.max_total).select_from(source).where(
+        rs.c.snapshot_day == day, *conditions).order_by(
+        *order_by, rs.c.active_days.desc(), rs.c.max_percent.desc(), rs.c.complex_id).offset(
+        page_current * page_size).limit(page_size)).all()
+    if not page:
+        return DataFrame(columns=RATING_COLUMNS), page_count
+    extras = complex_extras(conn, [row.complex_id for row in page])
+    return DataFrame([(row.symptom_complex_hash, row.active_days, row.max_percent,
+                       row.max_total, extras.get(row.complex_id, "{}"))
+                      for row in page], columns=RATING_COLUMNS), page_count
+
+
+def complex_extras(conn: Connection, complex_ids: List[int]) -> Dict[int, str]:
+    """Описания симптомокомлексов в формате extra get_trends_data
+
+    Args:
+        conn (Connection): Соединение
+        complex_ids (List[int]): id симптомокомлексов
+
+    Returns:
+        Dict[int, str]: Описание по id
+    """
+    if not complex_ids:
+        return {}
+    return dict(conn.execute(select(
+        COMPLEX_SYMPTOMS.c.complex_id,
+        func.replace(func.group_concat(SYMPTOMS.c.extra.distinct()), "},{", ",")).select_from(
+        COMPLEX_SYMPTOMS.join(SYMPTOMS, SYMPTOMS.c.id == COMPLEX_SYMPTOMS.c.symptom_id)).where(
+        COMPLEX_SYMPTOMS.c.complex_id.in_(complex_ids)).group_by(
+        COMPLEX_SYMPTOMS.c.complex_id)).all())
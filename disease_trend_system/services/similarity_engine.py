@@ -0,0 +1,100 @@
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional, Set
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.engine import Connection
+
+
+class SimilarityEngine(ABC):
+    """Базовый класс движка поиска похожих симптомокомлексов
+
+    Движок держит в памяти структуру, построенную по парам
+    (symptom_hash, symptom_complex_hash) сохраненных наблюдений.
+    Структура загружается один раз и дочитывает новые строки таблицы по id.
+    Последние lookback id перечитываются при каждом обращении (уже учтенные
+    пропускаются), чтобы подобрать строки других воркеров, закоммиченные
+    не по порядку id.
+    """
+
+    def __init__(self, lookback: int = 1000) -> None:
+        self.lookback = lookback
+        self._last_id: Optional[int] = None
+        self._recent_ids: Set[int] = set()
+        self._lock = threading.RLock()
+
+    def reset(self) -> None:
+        """Сбросить движок, он будет загружен заново при следующем обращении
+        """
+        with self._lock:
+            self._clear()
+            self._last_id = None
+            self._recent_ids = set()
+
+    def refresh(self, conn: Connection, source: Select) -> None:
+        """Загрузить движок или дочитать строки, добавленные после прошлого обращения
+
+        Args:
+            conn (Connection): Соединение
+            source (Select): Запрос строк (id, symptom_hash, symptom_complex_hash),
+                где id - возрастающий ключ наблюдения (строк на один id может быть несколько)
+        """
+        src = source.subquery()
+        with self._lock:
+            if self._last_id is None:
+                last_id = conn.execute(select(func.max(src.c.id))).scalar() or 0
+                query = select(src.c.symptom_hash, src.c.symptom_complex_hash,
+                               func.count()).where(src.c.id <= last_id).group_by(
+                    src.c.symptom_hash, src.c.symptom_complex_hash)
+                for symptom_hash, symptom_complex_hash, rows in conn.execute(query):
+                    self._add_rows(symptom_hash, symptom_complex_hash, rows)
+                self._recent_ids = set(conn.execute(select(src.c.id).where(
+                    src.c.id > last_id - self.lookback, src.c.id <= last_id)).scalars())
+                self._last_id = last_id
+            else:
+                seen_ids = self._recent_ids
+                new_ids = set()
+                query = select(src.c.id, src.c.symptom_hash, src.c.symptom_complex_hash).where(
+                    src.c.id > self._last_id - self.lookback).order_by(src.c.id)
+                for row_id, symptom_hash, symptom_complex_hash in conn.execute(query):
+                    if row_id in seen_ids:
+                        continue
+                    self._add(symptom_hash, symptom_complex_hash)
+                    new_ids.add(row_id)
+                    self._last_id = max(self._last_id, row_id)
+                low_id = self._last_id - self.lookback
+                self._recent_ids = {row_id for row_id in seen_ids | new_ids
+                                    if row_id > low_id}
+            self._flush()
+
+    @abstractmethod
+    def find_similar(self, symptom_hashes: List[str]) -> List[str]:
+        """Хеши симптомокомлексов, похожих на новый
+
+        Args:
+            symptom_hashes (List[str]): Хеши признаков нового симптомокомлекса
+
+        Returns:
+            List[str]: Хеши похожих симптомокомлексов
+        """
+
+    @abstractmethod
+    def _clear(self) -> None:
+        """Очистить структуру в памяти
+        """
+
+    @abstractmethod
+    def _add(self, symptom_hash: str, symptom_complex_hash: str) -> None:
+        """Учесть строку (symptom_hash, symptom_complex_hash)
+        """
+
+    def _add_rows(self, symptom_hash: str, symptom_complex_hash: str, rows: int) -> None:
+        """Учесть rows одинаковых строк при загрузке, движки со счетчиками
+        переопределяют его, чтобы не вызывать _add rows раз
+        """
+        for _ in range(rows):
+            self._add(symptom_hash, symptom_complex_hash)
+
+    def _flush(self) -> None:
+        """Достроить производные структуры после пачки вызовов _add
+        """
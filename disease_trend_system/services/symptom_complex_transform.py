@@ -2,7 +2,8 @@ import hashlib
 import json
 from dataclasses import asdict, astuple, dataclass
 from datetime import datetime
-from typing import Any, Dict, Generator, List
+from functools import lru_cache
+from typing import Any, Dict, Generator, List, Tuple
 
 import sqlalchemy
 from flask import request
@@ -12,10 +13,38 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import text
 
 from disease_trend_system.config import (hostname_db, name_db, password_db,
-                                         port, username_db)
+                                         port, symptom_hash_cache_size,
+                                         username_db)
 from disease_trend_system.services.symptom_complexes_dao import SymptomDTO
 
 
+def _extra(name: Any, value: Any) -> str:
+    """Описание признака в виде JSON-объекта {признак: значение}
+    """
+    return json.dumps({name: value}, ensure_ascii=False)
+
+
+@lru_cache(maxsize=symptom_hash_cache_size, typed=True)
+def _symptom_pair(name: str, value: Any) -> Tuple[str, str, str]:
+    """Каноническая запись признака, его хеш и описание
+
+    Запись - фрагмент json.dumps(..., sort_keys=True) для пары
+    "имя": значение, поэтому хеши совпадают с _dict_hash побайтно.
+    typed=True различает 1, 1.0 и True, которые кодируются по-разному.
+
+    Args:
+        name (str): Название признака
+        value (Any): Значение (хешируемое)
+
+    Returns:
+        Tuple[str, str, str]: Фрагмент JSON, MD5 объекта {name: value} и
+            описание признака (extra)
+    """
+    fragment = f"{json.dumps(name)}: {json.dumps(value, sort_keys=True)}"
+    return (fragment, hashlib.md5(f"{{{fragment}}}".encode()).hexdigest(),
+            _extra(name, value))
+
+
 class SymtomComplexTransform:
     """Класс преобразования симптомокомплексов в список объектов
     """
@@ -28,6 +57,64 @@ class SymtomComplexTransform:
         dhash.update(encoded)
         return dhash.hexdigest()
 
+    @staticmethod
+    def lower_symptoms(symptoms: Dict[Any, Any]) -> Dict[str, Any]:
+        """Названия и строковые значения признаков в нижнем регистре
+
+        Args:
+            symptoms (Dict[Any, Any]): Признаки симптомокомлекса
+
+        Returns:
+            Dict[str, Any]: Признаки в том виде, в каком они хешируются
+        """
+        return {str(name).lower(): value.lower() if isinstance(value, str) else value
+                for name, value in symptoms.items()}
+
+    @staticmethod
+    def symptom_entries(symptoms: Dict[str, Any]) -> Tuple[str, List[Tuple[str, str]]]:
+        """Хеш симптомокомлекса и (хеш, описание) его признаков
+
+        Хеши равны _dict_hash. Канонические записи признаков берутся из
+        LRU-кеша _symptom_pair, запись симптомокомлекса собирается из них
+        в порядке ключей.
+
+        Args:
+            symptoms (Dict[str, Any]): Признаки симптомокомлекса
+
+        Returns:
+            Tuple[str, List[Tuple[str, str]]]: Хеш симптомокомлекса и пары
+                (хеш, extra) признаков в порядке symptoms
+        """
+        pairs = {}
+        for name, value in symptoms.items():
+            if isinstance(name, str):
+                try:
+                    pairs[name] = _symptom_pair(name, value)
+                    continue
+                except TypeError as _:
+                    pass
+            # нестроковые ключи и списки/объекты в значениях - без кеша
+            return (SymtomComplexTransform._dict_hash(symptoms),
+                    [(SymtomComplexTransform._dict_hash({k: v}), _extra(k, v))
+                     for k, v in symptoms.items()])
+        encoded = "{" + ", ".join(pairs[name][0] for name in sorted(pairs)) + "}"
+        return (hashlib.md5(encoded.encode()).hexdigest(),
+                [(pair[1], pair[2]) for pair in pairs.values()])
+
+    @staticmethod
+    def symptom_hashes(symptoms: Dict[str, Any]) -> Tuple[str, List[str]]:
+        """Хеши симптомокомлекса и его признаков, равные _dict_hash
+
+        Args:
+            symptoms (Dict[str, Any]): Признаки симптомокомлекса
+
+        Returns:
+            Tuple[str, List[str]]: Хеш симптомокомлекса и хеши признаков
+                в порядке symptoms
+        """
+        symptom_complex_hash, entries = SymtomComplexTransform.symptom_entries(symptoms)
+        return symptom_complex_hash, [symptom_hash for symptom_hash, _ in entries]
+
     @staticmethod
     def symptom_complex_to_symptoms(symptom_complex: Dict[str, Any]) -> List[SymptomDTO]:
         """Преобразование симптомокомлексов в набор симптомов с хеш-ключами
@@ -38,20 +125,11 @@ class SymtomComplexTransform:
         Returns:
             List[SymptomDTO]: Список объектов ДТО класса
         """
-        result_lst = []
         symptoms = symptom_complex["symptoms"]
-        symptom_complex_hash = SymtomComplexTransform._dict_hash(symptoms)
-        for k, v in symptoms.items():
-            symptom_hash = SymtomComplexTransform._dict_hash({k: v})
-            result_lst.append(SymptomDTO(
-                name=k, value=v,
-                percent_people=symptom_complex["percent_people"],
-                total_number=symptom_complex["total_number_people"],
-                city=symptom_complex["city"],
-                region=symptom_complex["region"],
-                hospital=symptom_complex["hospital"],
-                date=symptom_complex["date_symptoms"],
-                symptom_hash=symptom_hash,
-                symptom_complex_hash=symptom_complex_hash))
-
-        return result_lst
+        symptom_complex_hash, entries = SymtomComplexTransform.symptom_entries(symptoms)
+        # поля отчета общие: кортежи признаков ссылаются на одни и те же объекты
+        report = (symptom_complex["percent_people"], symptom_complex["total_number_people"],
+                  symptom_complex["city"], symptom_complex["region"],
+                  symptom_complex["hospital"], symptom_complex["date_symptoms"])
+        return [SymptomDTO(name, value, *report, symptom_hash, symptom_complex_hash, extra)
+                for (name, value), (symptom_hash, extra) in zip(symptoms.items(), entries)]
@@ -1,19 +1,84 @@
-from dataclasses import asdict, dataclass
-from datetime import datetime
-from functools import cache
-from typing import Any, Generator, List, Optional
+import json
+import threading
+from datetime import date, datetime, timedelta
+from typing import (Any, Dict, Iterable, List, NamedTuple, Optional, Set,
+                    Tuple, Union)
 
 import pandas as pd
-import sqlalchemy
 from pandas import DataFrame
-from sqlalchemy import MetaData
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.sql import text
+from sqlalchemy import (Column, ColumnElement, FromClause, Select, and_, func,
+                        insert, select)
+from sqlalchemy.engine import Connection
+
+from disease_trend_system.config import (complex_cache_size,
+                                         geography_refresh, hostname_db,
+                                         minhash_bands,
+                                         minhash_permutations, name_db,
+                                         password_db, port, rating_window,
+                                         similarity_engine,
+                                         similarity_index_lookback,
+                                         similarity_radius,
+                                         similarity_threshold,
+                                         trends_cache_bytes,
+                                         trends_cache_entries, trends_cache_ttl,
+                                         trend_min_rising, trend_window,
+                                         trends_rollup, username_db)
+from disease_trend_system.database import get_engine
+from disease_trend_system.models import (Complex, ComplexSymptom, DailyRollup,
+                                         DailyRollupSource, Observation, Symptom)
+from disease_trend_system.services.complex_cache import ComplexIdCache
+from disease_trend_system.services.daily_rollup import RollupDelta
+from disease_trend_system.services.data_generation import read_generation
+from disease_trend_system.services.fake_name_service import \
+    generate_fake_symptom_complex_name
+from disease_trend_system.services.geography import (LOCATIONS,
+                                                     GeographyTree, Place)
+from disease_trend_system.services.minhash_index import MinHashIndex
+from disease_trend_system.services.rating_engine import (rating_page,
+                                                         trend_strength)
+from disease_trend_system.services.rating_snapshot import (
+    build_snapshot, complex_extras, daily_values, invalidate_snapshots,
+    read_rating_page, snapshot_ready, window_start)
+from disease_trend_system.services.similarity_engine import SimilarityEngine
+from disease_trend_system.services.symptom_index import SymptomIndex
+from disease_trend_system.services.table_query import apply_table_query
+from disease_trend_system.services.trend_state import (TREND_STATES,
+                                                       is_trending,
+                                                       lock_trend_states,
+                                                       update_trend_states)
+from disease_trend_system.services.trends_cache import TrendsCache
+
+SYMPTOMS = Symptom.__table__
+COMPLEXES = Complex.__table__
+COMPLEX_SYMPTOMS = ComplexSymptom.__table__
+OBSERVATIONS = Observation.__table__
+DAILY_ROLLUPS = DailyRollup.__table__
+DAILY_ROLLUP_SOURCES = DailyRollupSource.__table__
+
+
+def to_day(value: Union[str, date, datetime]) -> date:
+    """День из даты, даты-времени или ISO-строки (как приходит из DatePickerRange)
+
+    Args:
+        value (Union[str, date, datetime]): Дата
+
+    Returns:
+        date: День
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
 
 
-@dataclass
-class SymptomDTO:
+class SymptomDTO(NamedTuple):
     """Data transfer object
+
+    Признак симптомокомлекса. Поля отчета общие у всех признаков
+    симптомокомлекса и хранятся ссылками на одни и те же объекты; extra -
+    описание признака для словаря symptoms, рассчитывается вместе с хешем.
+    Названия и значения приходят уже в нижнем регистре (проверка запроса).
     """
     name: str
     value: Any
@@ -25,214 +90,169 @@ class SymptomDTO:
     date: datetime
     symptom_hash: str
     symptom_complex_hash: str
+    extra: str
 
-    def __post__init__(self):
-        self.name = self.name.lower()
-        if isinstance(self.value, str):
-            self.value = self.value.lower()
 
-    def __repr__(self) -> str:
-        extra = str({self.name: self.value})
-        extra = extra.replace('\'', '\"')
-        return f"({self.total_number},'{self.date}',{self.percent_people},'{self.city}','{self.region}','{self.hospital}','{extra}','{self.symptom_hash}','{self.symptom_complex_hash}')"
+def create_similarity_engine(name: str) -> SimilarityEngine:
+    """Создать движок поиска похожих симптомокомлексов
+
+    Args:
+        name (str): exact - точное совпадение len ± radius признаков,
+            minhash - MinHash/LSH с порогом Жаккара
+
+    Returns:
+        SimilarityEngine: Движок
+    """
+    if name == "exact":
+        return SymptomIndex(similarity_radius, similarity_index_lookback)
+    if name == "minhash":
+        return MinHashIndex(similarity_threshold, similarity_radius,
+                            minhash_permutations, minhash_bands,
+                            similarity_index_lookback)
+    raise ValueError(f"Unknown similarity engine: {name}")
 
 
 class SymptomsDAO:
-    """Объект доступа к таблице symptom_complexes
+    """Объект доступа к симптомокомлексам
+
+    Хранение нормализовано: словарь признаков (symptoms), наборы признаков
+    симптомокомлексов (complexes, complex_symptoms) и узкая таблица
+    наблюдений (observations) - одна строка на симптомокомлекс в отчете.
     """
     @staticmethod
-    def _symptoms_to_dict(symptoms: List[SymptomDTO]) -> Generator:
-        """Список DTO в список словарей
+    def _observation(complex_id: int, source_complex_id: int,
+                     symptom: SymptomDTO) -> Dict[str, Any]:
+        """Строка наблюдения для вставки
 
-        Args:symptom_complexe
-            symptoms (List[SymptomDTO]): Список симптомов
+        Args:
+            complex_id (int): Симптомокомлекс, под которым показывается наблюдение
+            source_complex_id (int): Симптомокомлекс из отчета
+            symptom (SymptomDTO): Любой признак отчета (поля отчета у них общие)
 
         Returns:
-            Generator: Генератор в словари
+            Dict[str, Any]: Параметры insert
         """
-        for symptom in symptoms:
-            extra = str({symptom.name: symptom.value})
-            symptom_dict = asdict(symptom)
-            symptom_dict.pop("name")
-            symptom_dict.pop("value")
-            symptom_dict["extra"] = extra
-            yield symptom_dict
-            del symptom_dict
+        return {"complex_id": complex_id,
+                "source_complex_id": source_complex_id,
+                "total_number": symptom.total_number,
+                "date": symptom.date,
+                "percent_people": symptom.percent_people,
+                "city": symptom.city,
+                "region": symptom.region,
+                "hospital": symptom.hospital}
 
     def __init__(self, usr: str, pswd: str, host: str, port: int, db: str) -> None:
-        self.engine = sqlalchemy.create_engine(
-            f"mysql+pymysql://{usr}:{pswd}@{host}:{port}/{db}")
-        self.metadata = MetaData()
-        self.metadata.reflect(bind=self.engine)
-        self.metadata.create_all(bind=self.engine, checkfirst=True)
+        self.engine = get_engine(usr, pswd, host, port, db)
+        self.similarity = create_similarity_engine(similarity_engine)
+        self.trends_cache = TrendsCache(
+            trends_cache_entries, trends_cache_bytes, trends_cache_ttl)
+        self.geography = GeographyTree(geography_refresh)
+        self.complexes = ComplexIdCache(complex_cache_size)
+        self._generation: Optional[int] = None
+        self._similarity_source: Select = select(
+            OBSERVATIONS.c.id, SYMPTOMS.c.symptom_hash,
+            COMPLEXES.c.symptom_complex_hash).select_from(
+            OBSERVATIONS.join(
+                COMPLEX_SYMPTOMS,
+                COMPLEX_SYMPTOMS.c.complex_id == OBSERVATIONS.c.source_complex_id).join(
+                SYMPTOMS, SYMPTOMS.c.id == COMPLEX_SYMPTOMS.c.symptom_id).join(
+                COMPLEXES, COMPLEXES.c.id == OBSERVATIONS.c.complex_id))
 
-    def _insert(self, symptoms: List[SymptomDTO]) -> None:
-        """Вставка данных в таблицу
+    @staticmethod
+    def _ids_by_hash(conn: Connection, column: Column, hashes: Iterable[str]) -> Dict[str, int]:
+        """id строк словаря по хешам
 
         Args:
-            symptoms (List[SymptomDTO]): Список симптомов (симтомокоплекс)
+            conn (Connection): Соединение
+            column (Column): Колонка хеша (symptoms.symptom_hash или
+                complexes.symptom_complex_hash)
+            hashes (Iterable[str]): Хеши
+
+        Returns:
+            Dict[str, int]: Хеш -> id для найденных строк
         """
-        self.metadata.reflect(bind=self.engine)
-        tbl = self.metadata.tables['symptom_complexes']
-        self.metadata.create_all(bind=self.engine, checkfirst=True)
-        with self.engine.connect() as conn:
-            for symptom_dict in SymptomsDAO._symptoms_to_dict(symptoms):
-                conn.execute(tbl.insert(),
-                             symptom_dict)
-            conn.commit()
-            conn.close()
-        self.engine.dispose()
+        hashes = list(hashes)
+        if not hashes:
+            return {}
+        id_column = column.table.c.id
+        query = select(column, id_column).where(column.in_(hashes))
+        return {row[0]: row[1] for row in conn.execute(query)}
 
-    def _insert_with_concurrency(self, symptoms: List[SymptomDTO]) -> None:
-        """Вставка данных с учетом пересечений с другими симптомокомлексами
+    def _ensure_symptoms(self, conn: Connection,
+                         symptom_complexes: List[List[SymptomDTO]]) -> Dict[str, int]:
+        """Добавить в словарь недостающие признаки
 
         Args:
-            symptoms (List[SymptomDTO]): Список симптомов
+            conn (Connection): Соединение с открытой транзакцией
+            symptom_complexes (List[List[SymptomDTO]]): Симптомокомлексы
+
+        Returns:
+            Dict[str, int]: symptom_hash -> id признака
         """
-        min_con = len(symptoms) - 1
-        max_con = len(symptoms) + 1
-        values = ','.join([str(symptom) for symptom in symptoms])
-        queries = {}
-        queries['query_1'] = '''create temporary table if not exists `symptom_complexes_temp` (
-                `total_number` int unsigned NOT NULL,
-                `date` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                `percent_people` double NOT NULL,
-                `city` varchar(64) NOT NULL,
-                `region` varchar(128) NOT NULL,
-                `hospital` varchar(128) NOT NULL,
-                `extra` json NOT NULL,
-                `symptom_hash` varchar(32) NOT NULL,
-                `symptom_complex_hash` varchar(32) NOT NULL
-                );'''
-        queries['query_2'] = "truncate symptom_complexes_temp;"
-        queries['query_3'] = '''create temporary table if not exists `symptom_complexes_hash_temp` (
-                `symptom_complex_hash` varchar(32) NOT NULL
-                );'''
-        queries['query_4'] = "truncate symptom_complexes_hash_temp;"
-        queries['query_5'] = f'''insert
-                    into
-                    symptom_complexes_temp (total_number,
-                    date,
-                    percent_people,
-                    city,
-                    region,
-                    hospital,
-                    extra,
-                    symptom_hash,
-                    symptom_complex_hash
-                    )
-                values
-                   {values};'''
-        queries['query_6'] = f'''insert
-                into
-                symptom_complexes_hash_temp (symptom_complex_hash)
-                            with cte as (
-                select
-                    sc.*,
-                    sct.total_number as '_total_number',
-                    sct.`date` as '_date',
-                    sct.percent_people as '_percent_people',
-                    sct.city as '_city',
-                    sct.region as '_region',
-                    sct.hospital as '_hospital',
-                    sct.extra as '_extra',
-                    sct.symptom_hash as '_symptom_hash',
-                    sct.symptom_complex_hash as '_symptom_complex_hash'
-                from
-                    symptom_complexes_temp sct
-                left join symptom_complexes sc on
-                    sct.symptom_hash = sc.symptom_hash
-                order by
-                    sct.symptom_hash),
-                cte_2 as (
-                select
-                    distinct symptom_complex_hash as symptom_complex_hash
-                from
-                    (
-                    select
-                        cte.*,
-                        count(1) over (partition by symptom_complex_hash) as `concurrency`
-                    from
-                        cte) mt
-                where
-                    mt.concurrency BETWEEN {min_con} and {max_con})
-                            select
-                symptom_complex_hash
-            from
-                cte_2;'''
-        queries['query_7'] = '''insert
-                    into
-                    symptom_complexes(total_number,
-                    `date`,
-                    percent_people,
-                    city,
-                    region,
-                    hospital,
-                    extra,
-                    symptom_hash,
-                    symptom_complex_hash
-                ) select
-                    sct.total_number,
-                    sct.`date`,
-                    sct.percent_people,
-                    sct.city,
-                    sct.region,
-                    sct.hospital,
-                    sct.extra,
-                    sct.symptom_hash,
-                    scht.symptom_complex_hash
-                from
-                    symptom_complexes_hash_temp scht
-                cross join symptom_complexes_temp sct;'''
-        queries['query_8'] = '''insert into symptom_complexes(total_number,
-                    `date`,
-                    percent_people,
-                    city,
-                    region,
-                    hospital,
-                    extra,
-                    symptom_hash,
-                    symptom_complex_hash)
-                select total_number,
-                    `date`,
-                    percent_people,
-                    city,
-                    region,
-                    hospital,
-                    extra,
-                    symptom_hash,
-                    symptom_complex_hash from symptom_complexes_temp;'''
-        queries['query_9'] = "truncate symptom_complexes_temp;"
-        queries['query_10'] = "truncate symptom_complexes_hash_temp;"
-        queries['query_11'] = "drop table if exists symptom_complexes_temp;"
-        queries['query_12'] = "drop table if exists symptom_complexes_hash_temp;"
+        extras = {symptom.symptom_hash: symptom.extra
+                  for symptoms in symptom_complexes for symptom in symptoms}
+        ids = self._ids_by_hash(conn, SYMPTOMS.c.symptom_hash, extras)
+        missing = [{"symptom_hash": symptom_hash, "extra": extra}
+                   for symptom_hash, extra in extras.items() if symptom_hash not in ids]
+        if missing:
+            conn.execute(insert(SYMPTOMS).prefix_with("IGNORE"), missing)
+            ids.update(self._ids_by_hash(
+                conn, SYMPTOMS.c.symptom_hash,
+                [row["symptom_hash"] for row in missing]))
+        return ids
+
+    def _ensure_complexes(self, conn: Connection,
+                          symptom_complexes: List[List[SymptomDTO]]) -> Tuple[Dict[str, int], Set[str]]:
+        """Добавить недостающие наборы признаков симптомокомлексов
 
-        try:
-            with self.engine.connect() as conn:
-                for _, query in queries.items():
-                    conn.execute(text(query))
-                    conn.commit()
-                conn.close()
-            self.engine.dispose()
-        except IntegrityError as _:
-            with self.engine.connect() as conn:
-                query = f'''insert
-                    into
-                    symptom_complexes (total_number,
-                    date,
-                    percent_people,
-                    city,
-                    region,
-                    hospital,
-                    extra,
-                    symptom_hash,
-                    symptom_complex_hash
-                    )
-                values
-                   {values};'''
-                conn.execute(text(query))
-                conn.commit()
-                conn.close()
+        Args:
+            conn (Connection): Соединение с открытой транзакцией
+            symptom_complexes (List[List[SymptomDTO]]): Симптомокомлексы
+
+        Returns:
+            Tuple[Dict[str, int], Set[str]]: symptom_complex_hash -> id
+                и хеши симптомокомлексов, которых до этого не было
+        """
+        members = {symptoms[0].symptom_complex_hash: symptoms
+                   for symptoms in symptom_complexes}
+        ids, unknown = self.complexes.lookup(members)
+        ids.update(self._ids_by_hash(conn, COMPLEXES.c.symptom_complex_hash, unknown))
+        new_hashes = {symptom_complex_hash for symptom_complex_hash in unknown
+                      if symptom_complex_hash not in ids}
+        if not new_hashes:
+            return ids, new_hashes
+        symptom_ids = self._ensure_symptoms(
+            conn, [members[symptom_complex_hash] for symptom_complex_hash in new_hashes])
+        conn.execute(insert(COMPLEXES).prefix_with("IGNORE"),
+                     [{"symptom_complex_hash": symptom_complex_hash,
+                       "symptom_count": len(members[symptom_complex_hash])}
+                      for symptom_complex_hash in new_hashes])
+        new_ids = self._ids_by_hash(
+            conn, COMPLEXES.c.symptom_complex_hash, new_hashes)
+        conn.execute(insert(COMPLEX_SYMPTOMS).prefix_with("IGNORE"),
+                     [{"complex_id": new_ids[symptom_complex_hash],
+                       "symptom_id": symptom_ids[symptom.symptom_hash]}
+                      for symptom_complex_hash in new_hashes
+                      for symptom in members[symptom_complex_hash]])
+        ids.update(new_ids)
+        return ids, new_hashes
+
+    def _find_similar(self, conn: Connection, symptoms: List[SymptomDTO]) -> List[int]:
+        """Поиск похожих симптомокомлексов движком подобия
+
+        Args:
+            conn (Connection): Соединение с открытой транзакцией
+            symptoms (List[SymptomDTO]): Список симптомов
+
+        Returns:
+            List[int]: id похожих симптомокомлексов
+        """
+        self.similarity.refresh(conn, self._similarity_source)
+        similar_hashes = self.similarity.find_similar(
+            [symptom.symptom_hash for symptom in symptoms])
+        ids, unknown = self.complexes.lookup(similar_hashes)
+        ids.update(self._ids_by_hash(conn, COMPLEXES.c.symptom_complex_hash, unknown))
+        return list(ids.values())
 
     def save_symptoms(self, symptoms: List[SymptomDTO]) -> None:
         """Сохранение списка симптов (симптомокомлекс) в таблицу
@@ -241,18 +261,119 @@ class SymptomsDAO:
             symptoms (List[SymptomDTO]): Симптомокомлекс
 
         """
-        symptom_complex_hash = symptoms[0].symptom_complex_hash
-        with self.engine.connect() as conn:
+        self.save_symptom_complexes([symptoms])
 
-            symptom_complex_hash_exist_query = text(
-                f"select id from symptom_complexes sc where sc.symptom_complex_hash = '{symptom_complex_hash}'")
-            proxy_result = conn.execute(symptom_complex_hash_exist_query)
-            flag_exists = bool([row._data for row in proxy_result])
-        if flag_exists:
-            self._insert(symptoms)
-        else:
-            self._insert_with_concurrency(symptoms)
-        self.engine.dispose()
+    def save_symptom_complexes(self, symptom_complexes: List[List[SymptomDTO]]) -> None:
+        """Сохранение пачки симптомокомлексов одной транзакцией
+
+        Наблюдение сохраняется под собственным симптомокомлексом, а для
+        нового симптомокомлекса - еще и под каждым похожим, найденным
+        движком подобия. Наблюдения копятся и вставляются многострочным
+        insert; перед поиском похожих накопленное сбрасывается, чтобы
+        порядок обработки совпадал с последовательной вставкой. В той же
+        транзакции обновляются дневные агрегаты daily_rollups, состояние
+        трендов trend_states затронутых симптомокомлексов и словарь мест
+        locations. id уже известных процессу симптомокомлексов берутся из
+        ComplexIdCache без чтения complexes.
+
+        Args:
+            symptom_complexes (List[List[SymptomDTO]]): Список симптомокомлексов
+        """
+        if not symptom_complexes:
+            return
+        if not self.complexes.loaded:
+            with self.engine.connect() as conn:
+                self.complexes.warm(conn)
+        try:
+            new_places, complex_ids = self._save_symptom_complexes(symptom_complexes)
+        except Exception:
+            self.similarity.reset()
+            raise
+        self.geography.add(new_places)
+        self.complexes.add(complex_ids)
+        days = [to_day(symptoms[0].date) for symptoms in symptom_complexes]
+        self.trends_cache.touch(min(days), max(days))
+
+    def _ensure_places(self, conn: Connection,
+                       symptom_complexes: List[List[SymptomDTO]]) -> List[Place]:
+        """Добавить в словарь locations места, которых нет в дереве географии
+
+        Args:
+            conn (Connection): Соединение с открытой транзакцией
+            symptom_complexes (List[List[SymptomDTO]]): Симптомокомлексы
+
+        Returns:
+            List[Place]: Новые места (добавляются в дерево после коммита)
+        """
+        if not self.geography.loaded:
+            self.geography.refresh(conn)
+        places = {(symptoms[0].city, symptoms[0].region, symptoms[0].hospital)
+                  for symptoms in symptom_complexes}
+        new_places = sorted(self.geography.missing(places))
+        if new_places:
+            conn.execute(insert(LOCATIONS).prefix_with("IGNORE"),
+                         [{"city": city, "region": region, "hospital": hospital}
+                          for city, region, hospital in new_places])
+        return new_places
+
+    def _check_generation(self, conn: Connection) -> None:
+        """Сбросить структуры в памяти, построенные по данным, которые
+        migrate с тех пор перезаписал
+
+        Args:
+            conn (Connection): Соединение
+        """
+        generation = read_generation(conn)
+        if generation == self._generation:
+            return
+        if self._generation is not None:
+            self.similarity.reset()
+            self.complexes.clear()
+            self.complexes.warm(conn)
+        self._generation = generation
+
+    def _save_symptom_complexes(self, symptom_complexes: List[List[SymptomDTO]]
+                                ) -> Tuple[List[Place], Dict[str, int]]:
+        with self.engine.begin() as conn:
+            self._check_generation(conn)
+            new_places = self._ensure_places(conn, symptom_complexes)
+            complex_ids, new_hashes = self._ensure_complexes(
+                conn, symptom_complexes)
+            observations: List[Dict[str, Any]] = []
+            rollup = RollupDelta()
+            for symptoms in symptom_complexes:
+                symptom_complex_hash = symptoms[0].symptom_complex_hash
+                complex_id = complex_ids[symptom_complex_hash]
+                group_ids = [complex_id]
+                if symptom_complex_hash in new_hashes:
+                    if observations:
+                        conn.execute(insert(OBSERVATIONS), observations)
+                        observations = []
+                    group_ids.extend(similar_id for similar_id in self._find_similar(conn, symptoms)
+                                     if similar_id != complex_id)
+                    new_hashes.discard(symptom_complex_hash)
+                day = to_day(symptoms[0].date)
+                for group_id in group_ids:
+                    observation = SymptomsDAO._observation(
+                        group_id, complex_id, symptoms[0])
+                    observations.append(observation)
+                    rollup.add(day, observation, len(symptoms))
+            if observations:
+                conn.execute(insert(OBSERVATIONS), observations)
+            touched = [(key[1], key[0]) for key in rollup.totals]
+            trend_states = lock_trend_states(conn, touched)
+            rollup.flush(conn)
+            update_trend_states(conn, trend_states, touched, trend_window,
+                                trend_min_rising)
+            days = [day for _, day in touched]
+            invalidate_snapshots(conn, min(days), max(days), rating_window)
+        return new_places, complex_ids
+
+    def _geography(self) -> GeographyTree:
+        if self.geography.needs_refresh():
+            with self.engine.connect() as conn:
+                self.geography.refresh(conn)
+        return self.geography
 
     def get_cities(self) -> List[str]:
         """Получить список городов
@@ -260,13 +381,7 @@ class SymptomsDAO:
         Returns:
             List[str]: Список городов
         """
-        with self.engine.connect() as conn:
-            cities = conn.execute(
-                text("select distinct city from symptom_complexes;"))
-
-            conn.close()
-            self.engine.dispose()
-        return [city[0] for city in cities]
+        return self._geography().cities()
 
     def get_regions_by_city(self, city: str) -> List[str]:
         """Получить список районов по городу
@@ -277,13 +392,7 @@ class SymptomsDAO:
         Returns:
             List[str]: список районов
         """
-        with self.engine.connect() as conn:
-            regions = conn.execute(
-                text(f"select distinct region from symptom_complexes sc where sc.city='{city}';"))
-
-            conn.close()
-            self.engine.dispose()
-        return [region[0] for region in regions]
+        return self._geography().regions(city)
 
     def get_hospitals_by_city_region(self, city: str, region: str) -> List[str]:
         """Получить список мед.учреждений по городу и району
@@ -295,73 +404,322 @@ class SymptomsDAO:
         Returns:
             List[str]: список мед. учреждений
         """
-        with self.engine.connect() as conn:
-            hospitals = conn.execute(
-                text(f"select distinct hospital from symptom_complexes sc where sc.city='{city}' and sc.region='{region}';"))
+        return self._geography().hospitals(city, region)
+
+    @staticmethod
+    def trends_key(start_date: datetime, end_date: datetime,
+                   city: Optional[str] = None, region: Optional[str] = None,
+                   hospital: Optional[str] = None,
+                   rollup: Optional[bool] = None) -> Tuple[date, date, Optional[str],
+                                                           Optional[str], Optional[str], bool]:
+        """Нормализованные параметры get_trends_data (ключ trends_cache)
 
-            conn.close()
-            self.engine.dispose()
-        return [hospital[0] for hospital in hospitals]
+        Returns:
+            Tuple: Первый и последний день, город, район, мед. учреждение, rollup
+        """
+        if rollup is None:
+            rollup = trends_rollup
+        # уточняющие фильтры без города (района) не применяются
+        if city is None:
+            region = None
+        if region is None:
+            hospital = None
+        return to_day(start_date), to_day(end_date), city, region, hospital, rollup
 
-    @cache
     def get_trends_data(self, start_date: datetime, end_date: datetime,
                         city: Optional[str] = None, region: Optional[str] = None,
-                        hospital: Optional[str] = None) -> DataFrame:
+                        hospital: Optional[str] = None,
+                        rollup: Optional[bool] = None) -> DataFrame:
         """Получить график трендов
 
+        Результат кешируется в trends_cache по нормализованным параметрам,
+        каждый вызов получает свою копию датафрейма.
+
         Args:
             start_date (datetime): Начала диапазона
             end_date (datetime): Конец диапазона
             city (str): Город
             region (str): Район
             hospital (str): Мед. учреждение
+            rollup (Optional[bool]): Читать дневные агрегаты daily_rollups вместо
+                наблюдений (по умолчанию TRENDS_ROLLUP)
 
         Returns:
             DataFrame: Датафрейм с данными
         """
-        condition = ''
+        key = self.trends_key(start_date, end_date, city, region, hospital, rollup)
+        start_day, end_day, city, region, hospital, rollup = key
+        df = self.trends_cache.get(key)
+        if df is not None:
+            return df
+        watermark = self.trends_cache.watermark()
+        df = self._read_trends_data(start_day, end_day, city, region, hospital, rollup)
+        self.trends_cache.put(key, df, start_day, end_day, watermark)
+        return df.copy()
+
+    @staticmethod
+    def _trends_conditions(table: FromClause, start_day: date, end_day: date,
+                           city: Optional[str], region: Optional[str],
+                           hospital: Optional[str]) -> List[ColumnElement]:
+        """Условия по дням и месту для таблицы с колонками day, city, region, hospital
+
+        Значения передаются связанными параметрами, поэтому форма выражения
+        (и запись в кеше скомпилированных выражений) зависит только от того,
+        какие фильтры заданы.
+        """
+        # полуоткрытый диапазон по хранимой колонке day использует индекс
+        conditions = [table.c.day >= start_day,
+                      table.c.day < end_day + timedelta(days=1)]
         if city is not None:
-            condition += f"and sc.city='{city}' "
+            conditions.append(table.c.city == city)
             if region is not None:
-                condition += f"and sc.region='{region}' "
+                conditions.append(table.c.region == region)
                 if hospital is not None:
-                    condition += f"and sc.hospital = '{hospital}'"
-        special_replace = '"},{"'
-        query_text = f'''with filtered_dates as (
-                select  
-                    sc.id ,
-                    sc.total_number,
-                    sc.percent_people,
-                    sc.city,
-                    sc.region,
-                    sc.hospital,
-                    sc.extra,
-                    sc.symptom_hash,
-                    sc.symptom_complex_hash,	
-                    date_format(sc.`date`, "%Y-%m-%d") as `date`
-                from
-                    symptom_complexes sc
-                where
-                    (date_format(sc.`date`, "%Y-%m-%d") BETWEEN date('{start_date}') and date('{end_date}'))
-                    {condition})
-                select
-                    sc.symptom_complex_hash,
-                    sc.date,
-                    avg(sc.percent_people) as percent_people,
-                    count(sc.total_number) as num_symp,
-                    avg(sc.total_number) as total_number,
-                    replace(GROUP_CONCAT(distinct(sc.extra)), {special_replace}, ",") as extra
-                from
-                    filtered_dates sc
-                group by
-                    sc.`date`,
-                    sc.symptom_complex_hash
-                order by
-                    `date`
-        '''
+                    conditions.append(table.c.hospital == hospital)
+        return conditions
+
+    def _read_trends_data(self, start_day: date, end_day: date, city: Optional[str],
+                          region: Optional[str], hospital: Optional[str],
+                          rollup: bool) -> DataFrame:
+        if rollup:
+            rollups = DAILY_ROLLUPS
+            sources_table = DAILY_ROLLUP_SOURCES
+            metrics = select(
+                rollups.c.complex_id,
+                rollups.c.day,
+                (func.sum(rollups.c.percent_sum) / func.sum(rollups.c.weight)).label(
+                    "percent_people"),
+                func.sum(rollups.c.weight).label("num_symp"),
+                (func.sum(rollups.c.total_sum) / func.sum(rollups.c.weight)).label(
+                    "total_number")).where(
+                *self._trends_conditions(rollups, start_day, end_day, city, region, hospital)
+            ).group_by(rollups.c.day, rollups.c.complex_id).cte("metrics")
+            sources = select(
+                sources_table.c.complex_id, sources_table.c.source_complex_id,
+                sources_table.c.day).distinct().where(
+                *self._trends_conditions(sources_table, start_day, end_day,
+                                         city, region, hospital)).cte("sources")
+        else:
+            o = OBSERVATIONS.alias("o")
+            c = COMPLEXES.alias("c")
+            filtered = select(
+                o.c.complex_id, o.c.source_complex_id, o.c.total_number,
+                o.c.percent_people, c.c.symptom_count, o.c.day).select_from(
+                o.join(c, c.c.id == o.c.source_complex_id)).where(
+                *self._trends_conditions(o, start_day, end_day, city, region, hospital)
+            ).cte("filtered_dates")
+            fd = filtered.c
+            metrics = select(
+                fd.complex_id,
+                fd.day,
+                (func.sum(fd.percent_people * fd.symptom_count) /
+                 func.sum(fd.symptom_count)).label("percent_people"),
+                func.sum(fd.symptom_count).label("num_symp"),
+                (func.sum(fd.total_number * fd.symptom_count) /
+                 func.sum(fd.symptom_count)).label("total_number")).group_by(
+                fd.day, fd.complex_id).cte("metrics")
+            sources = select(fd.complex_id, fd.source_complex_id, fd.day).distinct().cte(
+                "sources")
+        extras = select(
+            sources.c.complex_id,
+            sources.c.day,
+            func.replace(func.group_concat(SYMPTOMS.c.extra.distinct()), "},{", ",").label(
+                "extra")).select_from(
+            sources.join(COMPLEX_SYMPTOMS,
+                         COMPLEX_SYMPTOMS.c.complex_id == sources.c.source_complex_id).join(
+                SYMPTOMS, SYMPTOMS.c.id == COMPLEX_SYMPTOMS.c.symptom_id)).group_by(
+            sources.c.day, sources.c.complex_id).cte("extras")
+        query = select(
+            COMPLEXES.c.symptom_complex_hash,
+            func.date_format(metrics.c.day, "%Y-%m-%d").label("date"),
+            metrics.c.percent_people,
+            metrics.c.num_symp,
+            metrics.c.total_number,
+            COMPLEXES.c.symptom_count,
+            extras.c.extra).select_from(
+            metrics.join(extras, and_(extras.c.complex_id == metrics.c.complex_id,
+                                      extras.c.day == metrics.c.day)).join(
+                COMPLEXES, COMPLEXES.c.id == metrics.c.complex_id)).order_by(metrics.c.day)
         with self.engine.connect() as conn:
-            df = pd.read_sql(text(query_text), conn)
-            conn.close()
-            self.engine.dispose()
+            df = pd.read_sql(query, conn)
 
         return df
+
+    def get_trending_complexes(self, as_of: Optional[date] = None) -> DataFrame:
+        """Симптомокомлексы в тренде на день as_of по сохраненному состоянию trend_states
+
+        Флаг trending меняется только при записи наблюдений, поэтому тренд
+        проверяется заново на as_of: симптомокомлекс, о котором перестали
+        сообщать, выпадает из тренда, когда его дни уходят из окна.
+
+        Args:
+            as_of (Optional[date]): День, на который проверяется тренд (по умолчанию сегодня)
+
+        Returns:
+            DataFrame: symptom_complex_hash, segment_start, last_day
+        """
+        as_of = date.today() if as_of is None else to_day(as_of)
+        # на as_of >= last_day в окне не больше растущих дней, чем на last_day,
+        # поэтому достаточно строк с trending
+        query = select(COMPLEXES.c.symptom_complex_hash, TREND_STATES.c.segment_start,
+                       TREND_STATES.c.last_day, TREND_STATES.c.daily_values).select_from(
+            TREND_STATES.join(COMPLEXES, COMPLEXES.c.id == TREND_STATES.c.complex_id)).where(
+            TREND_STATES.c.trending.is_(True),
+            TREND_STATES.c.last_day > as_of - timedelta(days=trend_window),
+            TREND_STATES.c.last_day <= as_of)
+        rows = []
+        with self.engine.connect() as conn:
+            for symptom_complex_hash, segment_start, last_day, values in conn.execute(query):
+                values = {date.fromisoformat(day): value
+                          for day, value in json.loads(values).items()}
+                if is_trending(values, as_of, trend_window, trend_min_rising):
+                    rows.append((symptom_complex_hash, segment_start, last_day))
+        return DataFrame(rows, columns=["symptom_complex_hash", "segment_start", "last_day"])
+
+    def get_rating_page(self, day: Union[str, date, datetime], page_current: int,
+                        page_size: int, filter_query: Optional[str] = None,
+                        sort_by: Optional[List[Dict[str, str]]] = None
+                        ) -> Tuple[DataFrame, int]:
+        """Страница рейтинга симптомокомлексов за RATING_WINDOW дней до day
+
+        Читается из снимка rating_snapshots; недостающий или устаревший
+        снимок строится из снимка предыдущего дня. Блокировка строки дня
+        берется только для построения, актуальный снимок читается без нее.
+
+        Args:
+            day (Union[str, date, datetime]): Последний день окна
+            page_current (int): Номер страницы
+            page_size (int): Размер страницы
+            filter_query (Optional[str]): filter_query таблицы
+            sort_by (Optional[List[Dict[str, str]]]): sort_by таблицы
+
+        Returns:
+            Tuple[DataFrame, int]: Строки страницы и число страниц
+        """
+        day = to_day(day)
+        with self.engine.connect() as conn:
+            if snapshot_ready(conn, day, rating_window):
+                return read_rating_page(conn, day, page_current, page_size,
+                                        filter_query, sort_by)
+        with self.engine.begin() as conn:
+            build_snapshot(conn, day, rating_window)
+        with self.engine.connect() as conn:
+            return read_rating_page(conn, day, page_current, page_size,
+                                    filter_query, sort_by)
+
+    def get_rating_scores(self, day: Union[str, date, datetime]) -> DataFrame:
+        """Сила тренда симптомокомлексов за RATING_WINDOW дней до day
+
+        Результат кешируется в trends_cache и сбрасывается при записи
+        наблюдений за дни периода.
+
+        Args:
+            day (Union[str, date, datetime]): Последний день периода
+
+        Returns:
+            DataFrame: Результат rating_engine.trend_strength
+        """
+        end_day = to_day(day)
+        start_day = window_start(end_day, rating_window)
+        key = ("rating", start_day, end_day)
+        scores = self.trends_cache.get(key)
+        if scores is not None:
+            return scores
+        watermark = self.trends_cache.watermark()
+        with self.engine.connect() as conn:
+            values = DataFrame(daily_values(conn, start_day, end_day), columns=[
+                "complex_id", "day", "percent_people", "total_number"])
+        scores = trend_strength(values, start_day, end_day)
+        self.trends_cache.put(key, scores, start_day, end_day, watermark)
+        return scores.copy()
+
+    def _rating_table_page(self, scores: DataFrame, metric: str, page_current: int,
+                           page_size: int, filter_query: Optional[str],
+                           sort_by: Optional[List[Dict[str, str]]]) -> Tuple[DataFrame, int]:
+        """Страница оценок с фильтром и сортировкой таблицы рейтинга
+
+        Фильтр и сортировка применяются к значениям в том виде, в каком они
+        показаны в таблице; без сортировки таблицы строки идут по метрике.
+        """
+        view = scores.rename(columns={"active_days": "date", "max_percent": "percent_people",
+                                      "max_total": "total_number"})
+        view["percent_people"] = view["percent_people"] / 100
+        complex_ids = [int(complex_id) for complex_id in scores["complex_id"]]
+        with self.engine.connect() as conn:
+            hashes = self._complex_hashes(conn, complex_ids)
+            view["symptom_complex_hash"] = [
+                generate_fake_symptom_complex_name(hashes.get(complex_id, ""))
+                for complex_id in complex_ids]
+            if "{extra}" in (filter_query or "") or any(
+                    col["column_id"] == "extra" for col in sort_by or []):
+                extras = complex_extras(conn, complex_ids)
+                view["extra"] = [extras.get(complex_id, "{}") for complex_id in complex_ids]
+        # оценки упорядочены по complex_id, устойчивая сортировка сохраняет этот порядок при равенстве
+        sort_by = list(sort_by or []) + [{"column_id": metric, "direction": "desc"}]
+        page, page_count = apply_table_query(view, filter_query, sort_by, page_current, page_size)
+        return scores.loc[page.index], page_count
+
+    @staticmethod
+    def _complex_hashes(conn: Connection, complex_ids: List[int]) -> Dict[int, str]:
+        if not complex_ids:
+            return {}
+        return dict(conn.execute(select(
+            COMPLEXES.c.id, COMPLEXES.c.symptom_complex_hash).where(
+            COMPLEXES.c.id.in_(complex_ids))).all())
+
+    def get_rating_top(self, day: Union[str, date, datetime], metric: str,
+                       page_current: int, page_size: int, filter_query: Optional[str] = None,
+                       sort_by: Optional[List[Dict[str, str]]] = None) -> Tuple[DataFrame, int]:
+        """Страница рейтинга по метрике силы тренда (rating_engine.RATING_METRICS)
+
+        Без фильтра и сортировки таблицы страница отбирается top_k без
+        полной сортировки.
+
+        Args:
+            day (Union[str, date, datetime]): Последний день периода
+            metric (str): Метрика ранжирования
+            page_current (int): Номер страницы
+            page_size (int): Размер страницы
+            filter_query (Optional[str]): filter_query таблицы
+            sort_by (Optional[List[Dict[str, str]]]): sort_by таблицы
+
+        Returns:
+            Tuple[DataFrame, int]: Строки страницы (с symptom_complex_hash и
+                extra) и число страниц
+        """
+        scores = self.get_rating_scores(day)
+        if filter_query or sort_by:
+            page, page_count = self._rating_table_page(
+                scores, metric, page_current, page_size, filter_query, sort_by)
+        else:
+            page, page_count = rating_page(scores, metric, page_current, page_size)
+        complex_ids = [int(complex_id) for complex_id in page["complex_id"]]
+        with self.engine.connect() as conn:
+            hashes = self._complex_hashes(conn, complex_ids)
+            extras = complex_extras(conn, complex_ids)
+        page = page.assign(
+            symptom_complex_hash=[hashes.get(complex_id, "") for complex_id in complex_ids],
+            extra=[extras.get(complex_id, "{}") for complex_id in complex_ids])
+        return page, page_count
+
+
+_symptoms_dao: Optional[SymptomsDAO] = None
+_symptoms_dao_lock = threading.Lock()
+
+
+def get_symptoms_dao() -> SymptomsDAO:
+    """Получить общий для процесса DAO симптомокомплексов
+
+    DAO и движок подобия создаются один раз при первом обращении,
+    далее все запросы используют общий пул соединений.
+
+    Returns:
+        SymptomsDAO: Объект доступа к симптомокомлексам
+    """
+    global _symptoms_dao
+    if _symptoms_dao is None:
+        with _symptoms_dao_lock:
+            if _symptoms_dao is None:
+                _symptoms_dao = SymptomsDAO(
+                    username_db, password_db, hostname_db, port, name_db)
+    return _symptoms_dao
@@ -0,0 +1,66 @@
+from typing import Dict, List
+
+from disease_trend_system.services.similarity_engine import SimilarityEngine
+
+
+class SymptomIndex(SimilarityEngine):
+    """Инвертированный индекс symptom_hash -> {symptom_complex_hash: число строк}
+
+    Заменяет поиск пересечений через временные таблицы и оконную функцию:
+    пересечение нового симптомокомлекса со всеми сохраненными считается
+    в памяти за время, пропорциональное числу затронутых постингов.
+    """
+
+    def __init__(self, radius: int = 1, lookback: int = 1000) -> None:
+        super().__init__(lookback)
+        self.radius = radius
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._cardinalities: Dict[str, int] = {}
+
+    def _clear(self) -> None:
+        self._postings = {}
+        self._cardinalities = {}
+
+    def _add(self, symptom_hash: str, symptom_complex_hash: str) -> None:
+        self._add_rows(symptom_hash, symptom_complex_hash, 1)
+
+    def _add_rows(self, symptom_hash: str, symptom_complex_hash: str, rows: int) -> None:
+        postings = self._postings.setdefault(symptom_hash, {})
+        postings[symptom_complex_hash] = postings.get(
+            symptom_complex_hash, 0) + rows
+        self._cardinalities[symptom_complex_hash] = self._cardinalities.get(
+            symptom_complex_hash, 0) + rows
+
+    def find_similar(self, symptom_hashes: List[str]) -> List[str]:
+        """Хеши симптомокомлексов, пересекающихся с новым на len ± radius строк
+
+        Повторяет прежний SQL: пересечение - это число сохраненных строк
+        симптомокомлекса с совпавшим symptom_hash, а несовпавшие признаки
+        образуют отдельную группу; если в нее попадает len ± radius
+        признаков (симптомокомлекс почти целиком новый), похожие не ищутся.
+
+        Args:
+            symptom_hashes (List[str]): Хеши признаков нового симптомокомлекса
+
+        Returns:
+            List[str]: Хеши похожих симптомокомлексов
+        """
+        min_con = len(symptom_hashes) - self.radius
+        max_con = len(symptom_hashes) + self.radius
+        concurrency: Dict[str, int] = {}
+        unmatched = 0
+        with self._lock:
+            for symptom_hash in symptom_hashes:
+                postings = self._postings.get(symptom_hash)
+                if not postings:
+                    unmatched += 1
+                    continue
+                for symptom_complex_hash, rows in postings.items():
+                    if self._cardinalities[symptom_complex_hash] < min_con:
+                        continue
+                    concurrency[symptom_complex_hash] = concurrency.get(
+                        symptom_complex_hash, 0) + rows
+        if min_con <= unmatched <= max_con:
+            return []
+        return [symptom_complex_hash for symptom_complex_hash, rows in concurrency.items()
+                if min_con <= rows <= max_con]
@@ -0,0 +1,125 @@
+import operator as operators
+from typing import Any, Dict, List, Optional, Tuple
+
+from pandas import DataFrame, Series
+from sqlalchemy import ColumnElement, String, cast
+
+# порядок важен: двухсимвольные операторы проверяются раньше односимвольных
+OPERATORS = [["ge ", ">="], ["le ", "<="], ["lt ", "<"], ["gt ", ">"],
+             ["ne ", "!="], ["eq ", "="], ["contains "], ["datestartswith "]]
+
+COMPARISONS = {"ge": "ge", "le": "le", "lt": "lt", "gt": "gt", "ne": "ne", "eq": "eq"}
+
+SQL_COMPARISONS = {"ge": operators.ge, "le": operators.le, "lt": operators.lt,
+                   "gt": operators.gt, "ne": operators.ne, "eq": operators.eq}
+
+
+def split_filter_part(filter_part: str) -> Tuple[Optional[str], Optional[str], Any]:
+    """Разбор одного условия filter_query таблицы Dash
+
+    Args:
+        filter_part (str): Условие вида {колонка} оператор значение
+
+    Returns:
+        Tuple[Optional[str], Optional[str], Any]: Колонка, оператор и значение
+            или (None, None, None), если условие не распознано
+    """
+    for operator_type in OPERATORS:
+        for operator in operator_type:
+            if operator not in filter_part:
+                continue
+            name_part, value_part = filter_part.split(operator, 1)
+            name = name_part[name_part.find("{") + 1: name_part.rfind("}")]
+            value_part = value_part.strip()
+            if not value_part:
+                return None, None, None
+            quote = value_part[0]
+            if quote == value_part[-1] and quote in ("'", '"', "`") and len(value_part) > 1:
+                value: Any = value_part[1:-1].replace("\\" + quote, quote)
+            else:
+                try:
+                    value = float(value_part)
+                except ValueError as _:
+                    value = value_part
+            return name, operator_type[0].strip(), value
+    return None, None, None
+
+
+def _condition(column: Series, operator: str, value: Any) -> Series:
+    if operator in COMPARISONS:
+        return getattr(column, COMPARISONS[operator])(value)
+    text = column.astype(str)
+    if operator == "contains":
+        return text.str.contains(str(value), regex=False)
+    return text.str.startswith(str(value))
+
+
+def apply_table_query(df: DataFrame, filter_query: Optional[str],
+                      sort_by: Optional[List[Dict[str, str]]],
+                      page_current: int, page_size: int) -> Tuple[DataFrame, int]:
+    """Фильтрация, сортировка и страница для DataTable с custom-режимами
+
+    Args:
+        df (DataFrame): Данные таблицы
+        filter_query (Optional[str]): filter_query таблицы
+        sort_by (Optional[List[Dict[str, str]]]): sort_by таблицы
+        page_current (int): Номер страницы
+        page_size (int): Размер страницы
+
+    Returns:
+        Tuple[DataFrame, int]: Строки страницы и число страниц
+    """
+    if filter_query:
+        for filter_part in filter_query.split(" && "):
+            name, operator, value = split_filter_part(filter_part)
+            if name not in df.columns:
+                continue
+            try:
+                df = df[_condition(df[name], operator, value)]
+            except TypeError as _:
+                df = df.iloc[0:0]
+    if sort_by:
+        columns = [col["column_id"] for col in sort_by if col["column_id"] in df.columns]
+        ascending = [col["direction"] == "asc" for col in sort_by
+                     if col["column_id"] in df.columns]
+        if columns:
+            df = df.sort_values(columns, ascending=ascending, kind="mergesort")
+    page_count = max(1, -(-len(df) // page_size))
+    page_current = min(max(page_current or 0, 0), page_count - 1)
+    start = page_current * page_size
+    return df.iloc[start:start + page_size], page_count
+
+
+def sql_table_query(columns: Dict[str, ColumnElement], filter_query: Optional[str],
+                    sort_by: Optional[List[Dict[str, str]]]
+                    ) -> Tuple[List[ColumnElement], List[ColumnElement]]:
+    """filter_query и sort_by DataTable как условия WHERE и ORDER BY
+
+    Условия по неизвестным колонкам и нераспознанные условия
+    пропускаются, как и в apply_table_query.
+
+    Args:
+        columns (Dict[str, ColumnElement]): id колонки таблицы -> выражение SQL
+        filter_query (Optional[str]): filter_query таблицы
+        sort_by (Optional[List[Dict[str, str]]]): sort_by таблицы
+
+    Returns:
+        Tuple[List[ColumnElement], List[ColumnElement]]: Условия и сортировка
+    """
+    conditions = []
+    if filter_query:
+        for filter_part in filter_query.split(" && "):
+            name, operator, value = split_filter_part(filter_part)
+            column = columns.get(name)
+            if column is None:
+                continue
+            if operator in SQL_COMPARISONS:
+                conditions.append(SQL_COMPARISONS[operator](column, value))
+            elif operator == "contains":
+                conditions.append(cast(column, String).contains(str(value), autoescape=True))
+            else:
+                conditions.append(cast(column, String).startswith(str(value), autoescape=True))
+    order_by = [columns[col["column_id"]].asc() if col["direction"] == "asc"
+                else columns[col["column_id"]].desc()
+                for col in sort_by or [] if col["column_id"] in columns]
+    return conditions, order_by
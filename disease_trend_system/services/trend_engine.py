@@ -0,0 +1,158 @@
+import copy
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.typing import NDArray
+from pandas import DataFrame
+
+SEGMENT_COLUMNS = ["symptom_complex_hash", "start", "end", "duration",
+                   "status", "dynamics"]
+
+
+class TrendGrid(NamedTuple):
+    """Плотная сетка симптомокомлекс x день
+    """
+    hashes: NDArray
+    days: NDArray
+    codes: NDArray
+    day_index: NDArray
+    values: NDArray
+
+
+class TrendSegments(NamedTuple):
+    """Отрезки тренда в координатах сетки
+    """
+    rows: NDArray
+    starts: NDArray
+    ends: NDArray
+
+
+class SlidingWindowTrendEngine:
+    """Тренды по правилам скользящего окна
+
+    День считается ростом или стоянием, если симптомокомлекс наблюдался
+    и его метрика не меньше, чем в предыдущий день (появление после дня
+    без наблюдений тоже рост). Симптомокомлекс в тренде в день t, если
+    в окне из window дней, заканчивающемся t, таких дней не меньше
+    min_rising. Подряд идущие дни тренда образуют отрезок; его начало -
+    первый день окна, в котором тренд обнаружен, но не раньше дня после
+    предыдущего отрезка, динамика - дни строгого роста внутри отрезка.
+    Отрезок, доходящий до последнего дня данных, активен, остальные
+    завершены.
+    """
+
+    def __init__(self, window: int = 5, min_rising: int = 3, min_duration: int = 1,
+                 metric: str = "total_number") -> None:
+        if not 0 < min_rising <= window:
+            raise ValueError("min_rising must be between 1 and window")
+        self.window = window
+        self.min_rising = min_rising
+        self.min_duration = min_duration
+        self.metric = metric
+        self.day_range: Optional[Tuple[str, str]] = None
+
+    def with_day_range(self, first_day: str, last_day: str) -> "SlidingWindowTrendEngine":
+        """Копия движка с фиксированными границами сетки дней
+
+        Нужна при обработке части симптомокомлексов: первый и последний день
+        сетки влияют на правила, и результат должен совпадать с расчетом
+        по всему датафрейму.
+
+        Args:
+            first_day (str): Первый день (YYYY-MM-DD)
+            last_day (str): Последний день (YYYY-MM-DD)
+
+        Returns:
+            SlidingWindowTrendEngine: Копия движка
+        """
+        engine = copy.copy(self)
+        engine.day_range = (first_day, last_day)
+        return engine
+
+    def _grid(self, df: DataFrame) -> TrendGrid:
+        codes, hashes = pd.factorize(df["symptom_complex_hash"])
+        dates = pd.to_datetime(df["date"]).to_numpy().astype("datetime64[D]")
+        if self.day_range is None:
+            first, last = dates.min(), dates.max()
+        else:
+            first, last = np.array(self.day_range, dtype="datetime64[D]")
+        day_index = (dates - first).astype(np.int64)
+        days = np.arange(first, last + 1)
+        values = np.full((len(hashes), len(days)), np.nan)
+        values[codes, day_index] = df[self.metric].to_numpy(dtype=float)
+        return TrendGrid(np.asarray(hashes), days, codes, day_index, values)
+
+    def _segments(self, grid: TrendGrid) -> TrendSegments:
+        values = grid.values
+        observed = ~np.isnan(values)
+        up_or_flat = np.zeros_like(observed)
+        with np.errstate(invalid="ignore"):
+            up_or_flat[:, 1:] = observed[:, 1:] & (
+                ~observed[:, :-1] | (values[:, 1:] >= values[:, :-1]))
+        counts = np.cumsum(up_or_flat, axis=1)
+        shifted = np.pad(counts, ((0, 0), (self.window, 0)))[:, :-self.window]
+        trending = (counts - shifted) >= self.min_rising
+        edges = np.diff(np.pad(trending.astype(np.int8), ((0, 0), (1, 1))), axis=1)
+        rows, first_days = np.nonzero(edges == 1)
+        _, ends = np.nonzero(edges == -1)
+        starts = np.maximum(first_days - self.window + 1, 0)
+        # окно нового отрезка не заходит в предыдущий отрезок того же симптомокомлекса
+        same_row = np.flatnonzero(rows[1:] == rows[:-1]) + 1
+        starts[same_row] = np.maximum(starts[same_row], ends[same_row - 1])
+        return TrendSegments(rows, starts, ends - 1)
+
+    def segments(self, df: DataFrame) -> DataFrame:
+        """Отрезки тренда каждого симптомокомлекса
+
+        Args:
+            df (DataFrame): Данные get_trends_data
+
+        Returns:
+            DataFrame: symptom_complex_hash, start, end, duration, status
+                ("active"/"ended") и dynamics - даты роста внутри отрезка
+        """
+        if df.empty:
+            return DataFrame(columns=SEGMENT_COLUMNS)
+        grid = self._grid(df)
+        segments = self._segments(grid)
+        width = len(grid.days)
+        values = grid.values
+        rising = np.zeros(values.shape, dtype=bool)
+        with np.errstate(invalid="ignore"):
+            rising[:, 1:] = ~np.isnan(values[:, 1:]) & (
+                np.isnan(values[:, :-1]) | (values[:, 1:] > values[:, :-1]))
+        rising_keys = np.flatnonzero(rising)
+        lo = np.searchsorted(rising_keys, segments.rows * width + segments.starts, "left")
+        hi = np.searchsorted(rising_keys, segments.rows * width + segments.ends, "right")
+        labels = np.datetime_as_string(grid.days)
+        dynamics: List[List[str]] = [labels[rising_keys[low:high] % width].tolist()
+                                     for low, high in zip(lo, hi)]
+        return DataFrame({
+            "symptom_complex_hash": grid.hashes[segments.rows],
+            "start": labels[segments.starts],
+            "end": labels[segments.ends],
+            "duration": segments.ends - segments.starts + 1,
+            "status": np.where(segments.ends == width - 1, "active", "ended"),
+            "dynamics": dynamics,
+        }, columns=SEGMENT_COLUMNS)
+
+    def execute(self, df: DataFrame) -> DataFrame:
+        """Строки, попадающие в отрезки тренда не короче min_duration дней
+
+        Args:
+            df (DataFrame): Данные get_trends_data
+
+        Returns:
+            DataFrame: Отфильтрованные строки в исходном порядке
+        """
+        if df.empty:
+            return df[:]
+        grid = self._grid(df)
+        segments = self._segments(grid)
+        keep = segments.ends - segments.starts + 1 >= self.min_duration
+        marks = np.zeros((len(grid.hashes), len(grid.days) + 1), dtype=np.int64)
+        np.add.at(marks, (segments.rows[keep], segments.starts[keep]), 1)
+        np.add.at(marks, (segments.rows[keep], segments.ends[keep] + 1), -1)
+        inside = np.cumsum(marks[:, :-1], axis=1) > 0
+        return df[inside[grid.codes, grid.day_index]]
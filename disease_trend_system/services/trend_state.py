@@ -0,0 +1,235 @@
+import json
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.engine import Connection
+
+from disease_trend_system.models import DailyRollup, TrendState
+
+DAILY_ROLLUPS = DailyRollup.__table__
+TREND_STATES = TrendState.__table__
+
+ONE_DAY = timedelta(days=1)
+
+# daily_values строки-заглушки, вставленной lock_trend_states для блокировки
+EMPTY_VALUES = "{}"
+
+
+def is_trending(values: Dict[date, float], end_day: date, window: int,
+                min_rising: int) -> bool:
+    """Правило окна SlidingWindowTrendEngine для одного дня
+
+    Args:
+        values (Dict[date, float]): Дневные значения метрики
+        end_day (date): Последний день окна
+        window (int): Длина окна в днях
+        min_rising (int): Сколько дней окна должны расти или стоять
+
+    Returns:
+        bool: Симптомокомлекс в тренде на end_day
+    """
+    rising = 0
+    for offset in range(window):
+        day = end_day - offset * ONE_DAY
+        value = values.get(day)
+        if value is None:
+            continue
+        previous = values.get(day - ONE_DAY)
+        if previous is None or value >= previous:
+            rising += 1
+    return rising >= min_rising
+
+
+def advance_state(state: Optional[Dict[str, Any]], complex_id: int,
+                  new_values: Dict[date, float], window: int,
+                  min_rising: int) -> Dict[str, Any]:
+    """Новое состояние тренда после записи дневных значений
+
+    Работает за O(window) дней: проверяются только дни между прежним и
+    новым last_day (не больше window), значения старше окна отбрасываются.
+
+    Args:
+        state (Optional[Dict[str, Any]]): Строка trend_states или None
+        complex_id (int): id симптомокомлекса
+        new_values (Dict[date, float]): Пересчитанные значения по дням
+        window (int): Длина окна в днях
+        min_rising (int): Сколько дней окна должны расти или стоять
+
+    Returns:
+        Dict[str, Any]: Строка trend_states
+    """
+    if state is None:
+        values: Dict[date, float] = {}
+        last_day = max(new_values)
+        trending = False
+        segment_start = None
+    else:
+        values = {date.fromisoformat(day): value
+                  for day, value in json.loads(state["daily_values"]).items()}
+        last_day = max(state["last_day"], max(new_values))
+        trending = state["trending"]
+        segment_start = state["segment_start"]
+    values.update(new_values)
+    first_kept = last_day - window * ONE_DAY
+    values = {day: value for day, value in values.items() if day >= first_kept}
+
+    # тренд продолжается, только если держался каждый день после прежнего last_day
+    start_day = last_day if state is None else min(
+        state["last_day"] + ONE_DAY, last_day)
+    if (last_day - start_day).days >= window:
+        trending = False
+        start_day = last_day - (window - 1) * ONE_DAY
+    day = start_day
+    while day <= last_day:
+        day_trending = is_trending(values, day, window, min_rising)
+        if day_trending and not trending:
+            segment_start = max(day - (window - 1) * ONE_DAY, min(values))
+        trending = day_trending
+        day += ONE_DAY
+    return {"complex_id": complex_id,
+            "last_day": last_day,
+            "daily_values": json.dumps({day.isoformat(): value
+                                        for day, value in sorted(values.items())}),
+            "trending": trending,
+            "segment_start": segment_start if trending else None}
+
+
+def _daily_values(conn: Connection, pairs: Iterable[Tuple[int, date]]) -> Dict[int, Dict[date, float]]:
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return {}
+    query = select(DAILY_ROLLUPS.c.complex_id, DAILY_ROLLUPS.c.day,
+                   func.sum(DAILY_ROLLUPS.c.total_sum) / func.sum(DAILY_ROLLUPS.c.weight)).where(
+        tuple_(DAILY_ROLLUPS.c.day, DAILY_ROLLUPS.c.complex_id).in_(
+            [(day, complex_id) for complex_id, day in pairs])).group_by(
+        DAILY_ROLLUPS.c.complex_id, DAILY_ROLLUPS.c.day).with_for_update(read=True)
+    values: Dict[int, Dict[date, float]] = {}
+    for complex_id, day, value in conn.execute(query):
+        values.setdefault(complex_id, {})[day] = float(value)
+    return values
+
+
+def _save_states(conn: Connection, states: Iterable[Dict[str, Any]]) -> None:
+    states = list(states)
+    if not states:
+        return
+    stmt = mysql_insert(TREND_STATES)
+    stmt = stmt.on_duplicate_key_update(
+        last_day=stmt.inserted.last_day,
+        daily_values=stmt.inserted.daily_values,
+        trending=stmt.inserted.trending,
+        segment_start=stmt.inserted.segment_start)
+    conn.execute(stmt, states)
+
+
+def lock_trend_states(conn: Connection, pairs: Iterable[Tuple[int, date]]
+                      ) -> Dict[int, Optional[Dict[str, Any]]]:
+    """Заблокировать состояния трендов симптомокомлексов пачки
+
+    Вызывается до RollupDelta.flush: транзакции, пишущие один
+    симптомокомлекс, выполняют запись агрегатов и пересчет состояния по
+    очереди. Для симптомокомлексов без состояния вставляется заглушка,
+    чтобы было что блокировать и в их первый день.
+
+    Args:
+        conn (Connection): Соединение с открытой транзакцией
+        pairs (Iterable[Tuple[int, date]]): Пары (complex_id, день) из пачки
+
+    Returns:
+        Dict[int, Optional[Dict[str, Any]]]: Строка trend_states по id,
+            None - состояния еще нет
+    """
+    first_days: Dict[int, date] = {}
+    for complex_id, day in pairs:
+        first_days[complex_id] = min(day, first_days.get(complex_id, day))
+    if not first_days:
+        return {}
+    complex_ids = sorted(first_days)
+    conn.execute(insert(TREND_STATES).prefix_with("IGNORE"), [
+        {"complex_id": complex_id, "last_day": first_days[complex_id],
+         "daily_values": EMPTY_VALUES, "trending": False}
+        for complex_id in complex_ids])
+    states: Dict[int, Optional[Dict[str, Any]]] = dict.fromkeys(complex_ids)
+    for row in conn.execute(select(TREND_STATES).where(
+            TREND_STATES.c.complex_id.in_(complex_ids)).order_by(
+            TREND_STATES.c.complex_id).with_for_update()):
+        if row.daily_values != EMPTY_VALUES:
+            states[row.complex_id] = row._asdict()
+    return states
+
+
+def update_trend_states(conn: Connection, states: Dict[int, Optional[Dict[str, Any]]],
+                        pairs: Iterable[Tuple[int, date]], window: int,
+                        min_rising: int) -> None:
+    """Обновить состояние трендов симптомокомлексов, получивших наблюдения
+
+    Вызывается после RollupDelta.flush в той же транзакции, что и
+    lock_trend_states. Дневные значения читаются из daily_rollups
+    блокирующим чтением, поэтому видны агрегаты, закоммиченные
+    транзакциями, которые держали блокировку раньше.
+
+    Args:
+        conn (Connection): Соединение с открытой транзакцией
+        states (Dict[int, Optional[Dict[str, Any]]]): Результат lock_trend_states
+        pairs (Iterable[Tuple[int, date]]): Пары (complex_id, день) из пачки
+        window (int): Длина окна в днях
+        min_rising (int): Сколько дней окна должны расти или стоять
+    """
+    values = _daily_values(conn, pairs)
+    if not values:
+        return
+    _save_states(conn, [advance_state(states.get(complex_id), complex_id,
+                                      values[complex_id], window, min_rising)
+                        for complex_id in sorted(values)])
+
+
+def replay_states(days: Iterable[Tuple[int, date, float]], window: int,
+                  min_rising: int) -> Dict[int, Dict[str, Any]]:
+    """Состояния трендов, полученные проигрыванием дней по порядку
+
+    Дни каждого симптомокомлекса подаются по возрастанию, как при записи
+    наблюдений день за днем, поэтому начало длинного отрезка тренда
+    совпадает с тем, что получает update_trend_states.
+
+    Args:
+        days (Iterable[Tuple[int, date, float]]): (complex_id, день, значение)
+        window (int): Длина окна в днях
+        min_rising (int): Сколько дней окна должны расти или стоять
+
+    Returns:
+        Dict[int, Dict[str, Any]]: Строка trend_states по id
+    """
+    states: Dict[int, Dict[str, Any]] = {}
+    for complex_id, day, value in days:
+        states[complex_id] = advance_state(states.get(complex_id), complex_id,
+                                           {day: value}, window, min_rising)
+    return states
+
+
+def rebuild_trend_states(conn: Connection, window: int, min_rising: int) -> int:
+    """Пересчитать состояние трендов по daily_rollups
+
+    Проигрывается вся история дней с наблюдениями: начало отрезка тренда
+    может быть раньше последних window + 1 дней.
+
+    Args:
+        conn (Connection): Соединение с открытой транзакцией
+        window (int): Длина окна в днях
+        min_rising (int): Сколько дней окна должны расти или стоять
+
+    Returns:
+        int: Число строк trend_states
+    """
+    conn.execute(delete(TREND_STATES))
+    query = select(
+        DAILY_ROLLUPS.c.complex_id, DAILY_ROLLUPS.c.day,
+        func.sum(DAILY_ROLLUPS.c.total_sum) / func.sum(DAILY_ROLLUPS.c.weight)).group_by(
+        DAILY_ROLLUPS.c.complex_id, DAILY_ROLLUPS.c.day).order_by(
+        DAILY_ROLLUPS.c.complex_id, DAILY_ROLLUPS.c.day)
+    states = replay_states(((complex_id, day, float(value))
+                            for complex_id, day, value in conn.execute(query)),
+                           window, min_rising)
+    _save_states(conn, states.values())
+    return len(states)
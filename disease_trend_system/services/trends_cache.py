@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import date
+from typing import Deque, Hashable, NamedTuple, Optional, Tuple
+
+from pandas import DataFrame
+
+TOUCH_HISTORY = 1024
+
+
+class CacheEntry(NamedTuple):
+    frame: DataFrame
+    size: int
+    expires: float
+    start_day: date
+    end_day: date
+
+
+class TrendsCache:
+    """LRU-кеш результатов запросов трендов
+
+    Ограничен числом записей и суммарным размером датафреймов в байтах,
+    записи живут не дольше ttl секунд. Запись симптомокомлексов вызывает
+    touch с диапазоном дней пачки: пересекающиеся записи удаляются, а
+    водяной знак (номер последнего touch) не дает сохранить результат
+    запроса, начатого до записи. Другие процессы видят новые данные не
+    позже чем через ttl.
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 60.0) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._size = 0
+        self._watermark = 0
+        self._touches: Deque[Tuple[int, date, date]] = deque(maxlen=TOUCH_HISTORY)
+        self._lock = threading.Lock()
+
+    def watermark(self) -> int:
+        """Номер последнего touch, берется перед чтением из БД
+
+        Returns:
+            int: Водяной знак
+        """
+        with self._lock:
+            return self._watermark
+
+    def get(self, key: Hashable) -> Optional[DataFrame]:
+        """Копия закешированного результата
+
+        Args:
+            key (Hashable): Нормализованные параметры запроса
+
+        Returns:
+            Optional[DataFrame]: Датафрейм или None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+        return entry.frame.copy()
+
+    def put(self, key: Hashable, frame: DataFrame, start_day: date, end_day: date,
+            watermark: int) -> None:
+        """Сохранить результат запроса
+
+        Args:
+            key (Hashable): Нормализованные параметры запроса
+            frame (DataFrame): Результат, вызывающий не должен его изменять
+            start_day (date): Первый день диапазона
+            end_day (date): Последний день диапазона
+            watermark (int): Водяной знак, полученный до чтения из БД
+        """
+        size = int(frame.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if watermark < self._watermark:
+                if self._touches and self._touches[0][0] > watermark + 1:
+                    return
+                for seq, touch_start, touch_end in self._touches:
+                    if seq > watermark and touch_start <= end_day and start_day <= touch_end:
+                        return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CacheEntry(
+                frame, size, time.monotonic() + self.ttl, start_day, end_day)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def touch(self, start_day: date, end_day: date) -> None:
+        """Сбросить записи, чей диапазон пересекается с записанными днями
+
+        Args:
+            start_day (date): Первый записанный день
+            end_day (date): Последний записанный день
+        """
+        with self._lock:
+            self._watermark += 1
+            self._touches.append((self._watermark, start_day, end_day))
+            stale = [key for key, entry in self._entries.items()
+                     if entry.start_day <= end_day and start_day <= entry.end_day]
+            for key in stale:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._size -= entry.size
@@ -0,0 +1,73 @@
+import threading
+from datetime import datetime
+from typing import Optional
+
+from pandas import DataFrame
+
+from disease_trend_system.services.create_data_trend import \
+    create_trend_detector
+from disease_trend_system.services.fake_name_service import \
+    generate_fake_symptom_complex_name
+from disease_trend_system.services.symptom_complexes_dao import (
+    SymptomsDAO, get_symptoms_dao)
+
+
+class TrendsPipeline:
+    """Данные страницы трендов: get_trends_data, фильтр трендов, короткие имена
+
+    Результат для (даты, место, порог) хранится в trends_cache DAO, поэтому
+    ограничен и сбрасывается при записи так же, как запросы трендов.
+    График и детализация получают его без повторных запросов к БД.
+    """
+
+    def __init__(self, dao: SymptomsDAO) -> None:
+        self.dao = dao
+
+    def run(self, start_date: datetime, end_date: datetime, city: Optional[str],
+            region: Optional[str], hospital: Optional[str], threshold: int) -> DataFrame:
+        """Тренды с короткими именами симптомокомлексов
+
+        Args:
+            start_date (datetime): Начало периода
+            end_date (datetime): Конец периода
+            city (Optional[str]): Город
+            region (Optional[str]): Район
+            hospital (Optional[str]): Мед. учреждение
+            threshold (int): Порог тренда
+
+        Returns:
+            DataFrame: Копия результата, ее можно изменять
+        """
+        key = self.dao.trends_key(start_date, end_date, city, region, hospital)
+        cache_key = ("pipeline", threshold) + key
+        cache = self.dao.trends_cache
+        df = cache.get(cache_key)
+        if df is not None:
+            return df
+        watermark = cache.watermark()
+        df = self.dao.get_trends_data(start_date, end_date, city, region, hospital)
+        df = create_trend_detector(threshold).execute(df)
+        if not df.empty:
+            df["symptom_complex_hash"] = df["symptom_complex_hash"].apply(
+                generate_fake_symptom_complex_name)
+        df = df.reset_index(drop=True)
+        cache.put(cache_key, df, key[0], key[1], watermark)
+        return df.copy()
+
+
+_trends_pipeline: Optional[TrendsPipeline] = None
+_trends_pipeline_lock = threading.Lock()
+
+
+def get_trends_pipeline() -> TrendsPipeline:
+    """Получить общий для процесса конвейер трендов
+
+    Returns:
+        TrendsPipeline: Конвейер трендов
+    """
+    global _trends_pipeline
+    if _trends_pipeline is None:
+        with _trends_pipeline_lock:
+            if _trends_pipeline is None:
+                _trends_pipeline = TrendsPipeline(get_symptoms_dao())
+    return _trends_pipeline
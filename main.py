@@ -15,8 +15,8 @@ from disease_trend_system.callbacks.auth_callbalcks import (login_button_click,
 from disease_trend_system.callbacks.raiting_callbacks import \
     update_raiting_table
 from disease_trend_system.callbacks.trends_callbacks import (
-    display_hover, update_dropdown_cities, update_dropdown_hospitals,
-    update_line_chart)
+    update_dropdown_cities, update_dropdown_hospitals, update_line_chart,
+    update_trending_table)
 from disease_trend_system.callbacks.trends_callbacks_detail import (
     update_dropdown_cities_2, update_dropdown_hospitals_2, update_table)
 from disease_trend_system.layouts.auth_layout import (failed, login, logout,
@@ -0,0 +1,55 @@
+"""Микробенчмарк хеширования симптомокомлексов на корпусе фикстур
+
+Запуск: python -m tests.bench_hashing [--repeat N]
+
+Сравнивает прежний расчет (_dict_hash для симптомокомлекса и для каждого
+признака) с SymtomComplexTransform.symptom_hashes и проверяет, что хеши
+совпадают побайтно.
+"""
+import argparse
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from disease_trend_system.endpoints import SYMPTOM_COMPLEX_VALIDATOR
+from disease_trend_system.services.symptom_complex_transform import (
+    SymtomComplexTransform, _symptom_pair)
+from tests.load_fixtures import Generator
+
+
+def dict_hashes(symptoms: Dict[str, Any]) -> Tuple[str, List[str]]:
+    return (SymtomComplexTransform._dict_hash(symptoms),
+            [SymtomComplexTransform._dict_hash({k: v}) for k, v in symptoms.items()])
+
+
+def measure(hashes: Callable[[Dict[str, Any]], Tuple[str, List[str]]],
+            corpus: List[Dict[str, Any]], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for symptoms in corpus:
+            hashes(symptoms)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Symptom complex hashing benchmark")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="passes over the fixture corpus")
+    args = parser.parse_args()
+
+    corpus = []
+    for item in Generator().run():
+        symptom_complex, _ = SYMPTOM_COMPLEX_VALIDATOR.validate(item)
+        if symptom_complex is not None:
+            corpus.append(symptom_complex["symptoms"])
+    for symptoms in corpus:
+        assert SymtomComplexTransform.symptom_hashes(symptoms) == dict_hashes(symptoms)
+
+    _symptom_pair.cache_clear()
+    baseline = measure(dict_hashes, corpus, args.repeat)
+    memoized = measure(SymtomComplexTransform.symptom_hashes, corpus, args.repeat)
+    total = len(corpus) * args.repeat
+    print(f"complexes: {len(corpus)} x {args.repeat}, "
+          f"symptoms: {sum(len(symptoms) for symptoms in corpus)}")
+    print(f"_dict_hash:     {baseline:.3f} s ({total / baseline:,.0f} complexes/s)")
+    print(f"symptom_hashes: {memoized:.3f} s ({total / memoized:,.0f} complexes/s)")
+    print(f"speed-up: {baseline / memoized:.2f}x, cache: {_symptom_pair.cache_info()}")
@@ -4,9 +4,12 @@ import random
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Tuple
 
-from disease_trend_system.config import (hostname_db, name_db, password_db,
-                                         port, username_db)
-from disease_trend_system.endpoints import SymptomsDAO, SymtomComplexTransform
+from disease_trend_system.database import get_engine
+from disease_trend_system.endpoints import (SYMPTOM_COMPLEX_VALIDATOR,
+                                            SymtomComplexTransform)
+from disease_trend_system.migrate import upgrade
+from disease_trend_system.services.symptom_complexes_dao import \
+    get_symptoms_dao
 
 SECONDS = 24 * 60 * 60  # seconds in one day
 
@@ -374,10 +377,11 @@ class Generator:
 if __name__ == '__main__':
     generator = Generator()
     symptom_complexes = generator.run()
+    upgrade(get_engine())
+    symptom_dao = get_symptoms_dao()
 
-    for symptom_complex in symptom_complexes:
+    for item in symptom_complexes:
+        symptom_complex, _ = SYMPTOM_COMPLEX_VALIDATOR.validate(item)
         symptoms = SymtomComplexTransform.symptom_complex_to_symptoms(
             symptom_complex)
-        symptom_dao = SymptomsDAO(
-            username_db, password_db, hostname_db, port, name_db)
         symptom_dao.save_symptoms(symptoms)
@@ -0,0 +1,40 @@
+import os
+import signal
+
+from pandas import DataFrame
+
+from disease_trend_system.services import parallel_trends
+from disease_trend_system.services.parallel_trends import (
+    ParallelTrendDetector, get_trend_executor)
+
+
+class KillingDetector:
+    """Фильтр, который в процессе пула завершает этот процесс сигналом
+    """
+
+    def __init__(self, parent_pid: int) -> None:
+        self.parent_pid = parent_pid
+
+    def execute(self, df: DataFrame) -> DataFrame:
+        if os.getpid() != self.parent_pid:
+            os.kill(os.getpid(), signal.SIGKILL)
+        return df
+
+
+def test_broken_pool_falls_back_and_is_replaced():
+    df = DataFrame({
+        "symptom_complex_hash": ["a", "b", "c", "d"],
+        "date": ["2023-03-01"] * 4,
+        "total_number": [1, 2, 3, 4],
+    })
+    detector = ParallelTrendDetector(KillingDetector(os.getpid()), workers=2, min_rows=1)
+    broken = get_trend_executor(2)
+
+    result = detector.execute(df)
+
+    assert result.equals(df)
+    assert parallel_trends._executor is None
+    executor = get_trend_executor(2)
+    assert executor is not broken
+    assert executor.submit(abs, -1).result() == 1
+    parallel_trends.reset_trend_executor(executor)
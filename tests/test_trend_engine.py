@@ -0,0 +1,23 @@
+from pandas import DataFrame
+
+from disease_trend_system.services.trend_engine import SlidingWindowTrendEngine
+
+
+def test_close_segments_do_not_overlap():
+    # тренд прерывается на два дня: окно следующего отрезка (5 дней)
+    # заходило бы в предыдущий отрезок
+    values = [1, 4, 1, 2, 3, 2, 0, 0, 4, 3, 4, 2]
+    df = DataFrame({
+        "symptom_complex_hash": "h117",
+        "date": [f"2023-02-{day:02d}" for day in range(1, len(values) + 1)],
+        "total_number": values,
+    })
+    segments = SlidingWindowTrendEngine(window=5, min_rising=3).segments(df)
+
+    assert segments[["start", "end"]].values.tolist() == [
+        ["2023-02-01", "2023-02-06"],
+        ["2023-02-07", "2023-02-09"],
+        ["2023-02-10", "2023-02-12"],
+    ]
+    assert segments["duration"].tolist() == [6, 3, 3]
+    assert segments["status"].tolist() == ["ended", "ended", "active"]
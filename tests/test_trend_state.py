@@ -0,0 +1,31 @@
+from datetime import date, timedelta
+
+from disease_trend_system.services.trend_state import is_trending, replay_states
+
+
+def _days(values):
+    first = date(2023, 3, 1)
+    return [(1, first + timedelta(days=offset), float(value))
+            for offset, value in enumerate(values)]
+
+
+def test_replay_keeps_start_of_long_segment():
+    # отрезок тренда длиннее window + 1 дней
+    days = _days([5, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11])
+    state = replay_states(days, window=3, min_rising=3)[1]
+
+    assert state["trending"]
+    assert state["segment_start"] == date(2023, 3, 3)
+    # последние window + 1 дней дали бы более позднее начало
+    tail = replay_states(days[-4:], window=3, min_rising=3)[1]
+    assert tail["segment_start"] == date(2023, 3, 9)
+
+
+def test_trend_ends_when_reports_stop():
+    days = _days([1, 2, 3, 4])
+    state = replay_states(days, window=3, min_rising=2)[1]
+    values = {day: value for _, day, value in days}
+
+    assert state["trending"]
+    assert is_trending(values, date(2023, 3, 5), 3, 2)
+    assert not is_trending(values, date(2023, 3, 6), 3, 2)